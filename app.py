@@ -9,10 +9,12 @@
 """
 
 import os
+import json
+import time
 from functools import wraps
 from flask import (
     Flask, render_template, request, jsonify, session, redirect,
-    url_for, send_from_directory
+    url_for, send_from_directory, Response, stream_with_context
 )
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -23,11 +25,18 @@ from utils.genai_utils import (
     generate_code_content, generate_visual_content, generate_quiz,
     evaluate_answers, generate_revision, generate_flashcards,
     generate_concept_flow, answer_ml_chatbot, generate_concept_flow_for_chat,
-    generate_project_suggestions
+    generate_project_suggestions, stream_content, stream_ml_chatbot,
+    detect_level_from_question, llm_stats, STREAMABLE_STYLES
 )
-from utils.audio_utils import generate_audio
+from utils.audio_utils import submit_audio_job, get_audio_job
 from utils.video_utils import search_youtube_videos
 from utils.image_utils import generate_visual
+from utils.batch_utils import plan_batch, run_batch
+from utils.resilience_utils import LLMUnavailableError, BREAKER_COOLDOWN
+from utils.prefetch_utils import schedule_next_topics, take_quiz, cancel as cancel_prefetch
+from utils.concurrency_utils import (
+    submit, join, fan_out, LLM_TIMEOUT, VIDEO_TIMEOUT, IMAGE_TIMEOUT
+)
 
 load_dotenv()
 
@@ -35,6 +44,26 @@ app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "learnsphere-secret-key-change-in-prod")
 CORS(app)
 
+
+@app.before_request
+def _open_db_session():
+    # One pooled connection per request, borrowed on first query
+    models.begin_session()
+
+
+@app.teardown_request
+def _close_db_session(exc):
+    models.end_session()
+
+
+@app.errorhandler(LLMUnavailableError)
+def _llm_unavailable(e):
+    # Fail fast with a retryable status instead of tying up the worker
+    response = jsonify({"error": "The AI tutor is temporarily unavailable. Please try again shortly."})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(BREAKER_COOLDOWN)
+    return response
+
 # ═══════════════════════════════════════════════════════
 #                    AUTH ROUTES
 # ═══════════════════════════════════════════════════════
@@ -42,14 +71,7 @@ CORS(app)
 @app.route("/")
 def index():
     session.clear()
-    import uuid
-    guest_username = "guest_" + str(uuid.uuid4())[:8]
-    models.create_user(guest_username, "guest", f"{guest_username}@learnsphere.local", "Guest Learner")
-    user = models.authenticate_user(guest_username, "guest")
-    if user:
-        session["user_id"] = user["id"]
-        session["username"] = user["username"]
-        session["display_name"] = "Learner"
+    session["display_name"] = "Learner"
     return render_template("index.html")
 
 
@@ -151,39 +173,56 @@ def logout():
 # ═══════════════════════════════════════════════════════
 
 def login_required(f):
-    """Decorator to bypass login."""
+    """Decorator to bypass login: visitors without an account browse as a guest."""
     @wraps(f)
     def decorated(*args, **kwargs):
         if "user_id" not in session:
-            import uuid
-            guest_username = "guest_" + str(uuid.uuid4())[:8]
-            models.create_user(guest_username, "guest", f"{guest_username}@learnsphere.local", "Guest Learner")
-            user = models.authenticate_user(guest_username, "guest")
-            if user:
-                session["user_id"] = user["id"]
-                session["username"] = user["username"]
-                session["display_name"] = "Learner"
+            session.setdefault("display_name", "Learner")
         return f(*args, **kwargs)
     return decorated
 
 
+def current_user_id(provision=False):
+    """
+    The session user's id. Guests get a database row only once they first
+    save something (provision=True); until then this returns None.
+    Activity is recorded at most once per ACTIVITY_INTERVAL, which also
+    notices a session whose guest account was reaped meanwhile.
+    """
+    user_id = session.get("user_id")
+    if user_id is not None and time.time() - session.get("active_at", 0) >= models.ACTIVITY_INTERVAL:
+        if models.touch_user(user_id):
+            session["active_at"] = time.time()
+        else:
+            for key in ("user_id", "username", "active_at"):
+                session.pop(key, None)
+            user_id = None
+    if user_id is None and provision:
+        user_id, username = models.create_guest()
+        session["user_id"] = user_id
+        session["username"] = username
+        session["active_at"] = time.time()
+    return user_id
+
+
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    progress = models.get_progress(session["user_id"])
-    history = models.get_history(session["user_id"], limit=10)
+    user_id = current_user_id()
+    view = models.get_dashboard(user_id) if user_id else None
     return render_template(
         "dashboard.html",
         user={"display_name": session.get("display_name", "Learner")},
-        progress=progress,
-        history=history
+        progress=view["progress"] if view else None,
+        history=view["history"][:10] if view else []
     )
 
 
 @app.route("/learn")
 @login_required
 def learn():
-    progress = models.get_progress(session["user_id"])
+    user_id = current_user_id()
+    progress = models.get_progress(user_id) if user_id else None
     return render_template(
         "learn.html",
         user={"display_name": session.get("display_name", "Learner")},
@@ -195,26 +234,57 @@ def learn():
 #                    API ROUTES
 # ═══════════════════════════════════════════════════════
 
+def _json_with_etag(view, key, default):
+    """
+    JSON response for one part of a dashboard view, validated by the view's
+    ETag: a matching If-None-Match gets a 304 without building the body.
+    """
+    if view is None:
+        return jsonify(default)
+    etag = f"{key}-{view['etag']}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(view[key])
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _sse(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events):
+    """Stream an iterable of pre-formatted SSE strings to the client."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route("/api/progress", methods=["GET"])
 @login_required
 def api_get_progress():
-    progress = models.get_progress(session["user_id"])
-    return jsonify(progress or {})
+    user_id = current_user_id()
+    return _json_with_etag(models.get_dashboard(user_id) if user_id else None, "progress", {})
 
 
 @app.route("/api/progress", methods=["POST"])
 @login_required
 def api_save_progress():
     data = request.get_json()
-    models.save_progress(session["user_id"], **data)
+    models.save_progress(current_user_id(provision=True), **data)
     return jsonify({"success": True})
 
 
 @app.route("/api/history", methods=["GET"])
 @login_required
 def api_get_history():
-    history = models.get_history(session["user_id"])
-    return jsonify(history)
+    user_id = current_user_id()
+    return _json_with_etag(models.get_dashboard(user_id) if user_id else None, "history", [])
 
 
 @app.route("/api/roadmap", methods=["POST"])
@@ -224,11 +294,15 @@ def api_generate_roadmap():
     level = data.get("level", "Beginner")
     roadmap = generate_roadmap(level)
     # Save to progress
+    user_id = current_user_id(provision=True)
     models.save_progress(
-        session["user_id"],
+        user_id,
         level=level,
         current_roadmap=roadmap
     )
+    # Learners almost always start at the top; warm the first topics
+    progress = models.get_progress(user_id)
+    schedule_next_topics(user_id, roadmap, None, level, progress.get("learning_style"))
     return jsonify({"roadmap": roadmap})
 
 
@@ -240,22 +314,28 @@ def api_generate_content():
     level = data.get("level", "Beginner")
     style = data.get("style", "Reading")
 
+    user_id = current_user_id(provision=True)
     models.save_progress(
-        session["user_id"],
+        user_id,
         current_topic=topic,
         learning_style=style
     )
+    progress = models.get_progress(user_id)
+    schedule_next_topics(user_id, progress.get("current_roadmap"), topic, level, style)
+
+    if data.get("stream") and style in STREAMABLE_STYLES:
+        return _sse_response(_stream_content_events(style, topic, level))
 
     if style == "Reading":
         content = generate_reading_content(topic, level)
         return jsonify({"content": content, "type": "text"})
 
     elif style == "Auditory":
+        # TTS runs in the background; the client polls /api/audio/<job_id>
         script = generate_audio_script(topic, level)
-        audio_path = generate_audio(script, topic)
         return jsonify({
             "content": script,
-            "audio_path": "/" + audio_path.replace("\\", "/"),
+            "audio_job": submit_audio_job(script, topic),
             "type": "audio"
         })
 
@@ -264,24 +344,45 @@ def api_generate_content():
         return jsonify({"content": content, "type": "text"})
 
     elif style == "Visual":
-        diagrams = generate_visual_content(topic, level)
-        videos = search_youtube_videos(topic, max_results=3)
+        results = fan_out({
+            "diagrams": (
+                lambda: generate_visual_content(topic, level),
+                LLM_TIMEOUT,
+                "⚠️ Visual content is taking too long to generate. Please try again."
+            ),
+            "videos": (lambda: search_youtube_videos(topic, max_results=3), VIDEO_TIMEOUT, []),
+        })
         return jsonify({
-            "content": diagrams,
-            "videos": videos,
+            "content": results["diagrams"],
+            "videos": results["videos"],
             "type": "visual"
         })
 
     return jsonify({"content": "Style not supported", "type": "text"})
 
 
+def _stream_content_events(style, topic, level):
+    """SSE events for /api/content: `token` chunks, then `done` with any extras."""
+    # Start the YouTube scrape now so it overlaps with the LLM stream
+    videos = submit(search_youtube_videos, topic, max_results=3) if style == "Visual" else None
+    try:
+        for chunk in stream_content(style, topic, level):
+            yield _sse("token", {"text": chunk})
+        done = {"type": "visual" if style == "Visual" else "text"}
+        if videos is not None:
+            done["videos"] = join(videos, VIDEO_TIMEOUT, [])
+        yield _sse("done", done)
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+
+
 @app.route("/api/quiz", methods=["POST"])
 @login_required
 def api_generate_quiz():
     data = request.get_json()
     topic = data.get("topic", "")
     level = data.get("level", "Beginner")
-    quiz = generate_quiz(topic, level)
+    quiz = take_quiz(current_user_id(), topic, level) or generate_quiz(topic, level)
     return jsonify({"quiz": quiz})
 
 
@@ -309,28 +410,28 @@ def api_evaluate():
     score = feedback.get("score", 0)
     total = feedback.get("total", 3)
     pct = feedback.get("percentage", 0)
-    models.add_history(
-        session["user_id"],
+    xp_earned = int(pct * 0.5) + 10
+    new_xp = models.record_evaluation(
+        current_user_id(provision=True),
         topic,
         quiz_score=score,
-        quiz_total=total
+        quiz_total=total,
+        xp_earned=xp_earned
     )
 
-    xp_earned = int(pct * 0.5) + 10
-    new_xp = models.add_xp(session["user_id"], xp_earned)
-
-    # Update topics completed
-    progress = models.get_progress(session["user_id"])
-    completed = progress.get("topics_completed", [])
-    if topic not in completed:
-        completed.append(topic)
-        models.save_progress(session["user_id"], topics_completed=completed)
-
     feedback["xp_earned"] = xp_earned
     feedback["total_xp"] = new_xp
     return jsonify(feedback)
 
 
+@app.route("/api/prefetch/cancel", methods=["POST"])
+def api_cancel_prefetch():
+    user_id = current_user_id()
+    if user_id:
+        cancel_prefetch(user_id)
+    return jsonify({"success": True})
+
+
 @app.route("/api/revision", methods=["POST"])
 @login_required
 def api_revision():
@@ -349,7 +450,7 @@ def api_flashcards():
     topic = data.get("topic", "")
     level = data.get("level", "Beginner")
     cards = generate_flashcards(topic, level)
-    models.add_xp(session["user_id"], 15)
+    models.add_xp(current_user_id(provision=True), 15)
     return jsonify({"cards": cards})
 
 
@@ -363,6 +464,40 @@ def api_concept_flow():
     return jsonify({"content": content})
 
 
+@app.route("/api/batch", methods=["POST"])
+@login_required
+def api_batch():
+    """
+    Generate many (generator, topic, level) jobs at once. Streams NDJSON:
+    one line per unique job as it finishes, then a summary line.
+    """
+    data = request.get_json() or {}
+    try:
+        plan = plan_batch(data.get("jobs"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def lines():
+        started = time.monotonic()
+        failed = 0
+        for line in run_batch(plan):
+            failed += not line["ok"]
+            yield json.dumps(line) + "\n"
+        yield json.dumps({
+            "done": True,
+            "jobs": len(data["jobs"]),
+            "unique": len(plan),
+            "failed": failed,
+            "elapsed_ms": round((time.monotonic() - started) * 1000),
+        }) + "\n"
+
+    return Response(
+        stream_with_context(lines()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route("/api/chat", methods=["POST"])
 @login_required
 def api_chat():
@@ -372,6 +507,10 @@ def api_chat():
     context_topic = data.get("context_topic")
     chat_history = data.get("chat_history", [])
     mode = data.get("mode", "text")
+    level = _resolve_chat_level(question, level)
+
+    if mode == "text" and data.get("stream"):
+        return _sse_response(_stream_chat_events(question, level, context_topic, chat_history))
 
     if mode == "text":
         result = answer_ml_chatbot(
@@ -382,7 +521,8 @@ def api_chat():
         )
         return jsonify({
             "text": result["text"],
-            "suggestions": result.get("suggestions", [])
+            "suggestions": result.get("suggestions", []),
+            "usage": result.get("usage")
         })
 
     elif mode == "flow":
@@ -394,16 +534,21 @@ def api_chat():
         })
 
     elif mode == "image":
-        result = answer_ml_chatbot(
-            question,
-            level=level,
-            context_topic=context_topic
-        )
-        img_path, img_desc = generate_visual(question)
+        results = fan_out({
+            "answer": _chat_answer_branch(question, level, context_topic),
+            "image": (
+                lambda: generate_visual(question),
+                IMAGE_TIMEOUT,
+                (None, "Image generation timed out. Please try again.")
+            ),
+        })
+        result = results["answer"]
+        img_path, img_desc = results["image"]
         path = "/" + img_path.replace("\\", "/") if img_path else None
         return jsonify({
             "text": result["text"],
             "suggestions": result.get("suggestions", []),
+            "usage": result.get("usage"),
             "media": {
                 "type": "image",
                 "path": path,
@@ -412,32 +557,37 @@ def api_chat():
         })
 
     elif mode == "audio":
-        result = answer_ml_chatbot(
-            question,
-            level=level,
-            context_topic=context_topic
-        )
-        script = generate_audio_script(question, level or "Beginner")
-        audio_path = generate_audio(script, question)
+        results = fan_out({
+            "answer": _chat_answer_branch(question, level, context_topic),
+            "script": (
+                lambda: generate_audio_script(question, level or "Beginner"),
+                LLM_TIMEOUT,
+                None
+            ),
+        })
+        result = results["answer"]
+        script = results["script"]
         return jsonify({
             "text": result["text"],
             "suggestions": result.get("suggestions", []),
+            "usage": result.get("usage"),
             "media": {
                 "type": "audio",
-                "path": "/" + audio_path.replace("\\", "/")
+                "job": submit_audio_job(script, question) if script else None
             }
         })
 
     elif mode == "video":
-        result = answer_ml_chatbot(
-            question,
-            level=level,
-            context_topic=context_topic
-        )
-        videos = search_youtube_videos(question, max_results=3)
+        results = fan_out({
+            "answer": _chat_answer_branch(question, level, context_topic),
+            "videos": (lambda: search_youtube_videos(question, max_results=3), VIDEO_TIMEOUT, []),
+        })
+        result = results["answer"]
+        videos = results["videos"]
         return jsonify({
             "text": result["text"],
             "suggestions": result.get("suggestions", []),
+            "usage": result.get("usage"),
             "media": {
                 "type": "video",
                 "videos": videos
@@ -447,6 +597,38 @@ def api_chat():
     return jsonify({"text": "Mode not supported", "suggestions": []})
 
 
+def _resolve_chat_level(question, level):
+    """The requested level, else one detected from the question."""
+    return level or detect_level_from_question(question)
+
+
+def _chat_answer_branch(question, level, context_topic):
+    """fan_out branch for the GyanGuru text answer that accompanies a media reply."""
+    return (
+        lambda: answer_ml_chatbot(question, level=level, context_topic=context_topic),
+        LLM_TIMEOUT,
+        {"text": "⚠️ GyanGuru is taking too long to answer. Please try again.", "suggestions": []}
+    )
+
+
+def _stream_chat_events(question, level, context_topic, chat_history):
+    """SSE events for text-mode /api/chat: `token` chunks, then `done` with suggestions."""
+    try:
+        for kind, payload in stream_ml_chatbot(
+            question,
+            level=level,
+            context_topic=context_topic,
+            chat_history=chat_history
+        ):
+            if kind == "token":
+                yield _sse("token", {"text": payload})
+            else:
+                yield _sse("done", {"text": payload["text"], "suggestions": payload["suggestions"],
+                                    "usage": payload["usage"]})
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+
+
 @app.route("/api/projects", methods=["POST"])
 @login_required
 def api_projects():
@@ -457,6 +639,24 @@ def api_projects():
     return jsonify({"content": projects})
 
 
+@app.route("/api/audio/<job_id>", methods=["GET"])
+def api_audio_job(job_id):
+    job = get_audio_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown audio job"}), 404
+    return jsonify({
+        "status": job["status"],
+        "audio_path": "/generated_audio/" + os.path.basename(job["path"]) if job["path"] else None,
+        "error": job["error"]
+    })
+
+
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    """Process-local counters: LLM single-flight/cache, DB pool and dashboard views."""
+    return jsonify({"llm": llm_stats(), "db_pool": models.pool_stats(), "dashboard": models.dashboard_stats()})
+
+
 # Serve generated audio files
 @app.route("/generated_audio/<path:filename>")
 def serve_audio(filename):
@@ -1,28 +1,173 @@
 """
-LearnSphere — Database Models (SQLite)
+LearnSphere — Database Models (SQLite, or PostgreSQL via DATABASE_URL)
 Handles user accounts, progress tracking, and learning history.
 """
 
-import sqlite3
 import json
 import os
+import time
+import uuid
+import queue
+import hashlib
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import bcrypt  # type: ignore
 
+from utils.storage_utils import get_backend
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "learnsphere.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Guest accounts inactive for this long are reaped
+GUEST_TTL_HOURS = int(os.getenv("GUEST_TTL_HOURS", "48"))
+GUEST_REAP_INTERVAL = 60 * 60
+# touch_user() calls closer together than this may be skipped by callers
+ACTIVITY_INTERVAL = 60 * 60
+# Buffer quiz outcomes in memory and write them in batches (loses up to one
+# interval of XP/history if the process dies); off by default
+XP_WRITE_BEHIND = os.getenv("XP_WRITE_BEHIND", "0") == "1"
+XP_FLUSH_INTERVAL = float(os.getenv("XP_FLUSH_INTERVAL", "2"))
+# Per-user dashboard views (progress + recent history) kept in memory, checked
+# against user_progress.version (bumped by every write, in any process) on use
+DASHBOARD_CACHE_USERS = int(os.getenv("DASHBOARD_CACHE_USERS", "2048"))
+DASHBOARD_HISTORY = 20
+# Seconds a cached dashboard view is served without re-reading its version. Local
+# writes invalidate it at commit; this bounds how long a write made by another
+# process or node can go unseen (0 = check the version on every read).
+DASHBOARD_REVALIDATE = float(os.getenv("DASHBOARD_REVALIDATE", "2"))
+
+
+# ─────────────── CONNECTIONS ───────────────
+
+# Selected by DATABASE_URL (see utils/storage_utils.py); SQLite at DB_PATH by default
+backend = get_backend(sqlite_path=DB_PATH)
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable connections; each keeps its prepared-statement cache."""
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.opened += 1
+            return self._factory()
+
+    def release(self, conn):
+        if getattr(conn, "closed", False):
+            return  # dropped by the server; the next acquire opens a fresh one
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
 
+_pool = ConnectionPool(backend.connect, DB_POOL_SIZE)
+_local = threading.local()
 
+
+def begin_session():
+    """
+    Start a request session on this thread: every model call until end_session()
+    shares one pooled connection, borrowed lazily on first use.
+    """
+    _local.active = True
+    _local.conn = None
+    _local.tx_depth = 0
+    _local.changed = set()
+
+
+def end_session():
+    """Return the request's connection to the pool (rolling back anything uncommitted)."""
+    conn = getattr(_local, "conn", None)
+    _local.active = False
+    _local.conn = None
+    _local.tx_depth = 0
+    _local.changed = set()
+    if conn is not None:
+        _pool.release(conn)
+
+
+def _session_conn():
+    """The current request session's connection, or None outside a session."""
+    if not getattr(_local, "active", False):
+        return None
+    if _local.conn is None:
+        _local.conn = _pool.acquire()
+    return _local.conn
+
+
+@contextmanager
 def get_db():
-    """Get a database connection."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """
+    Get a database connection for one unit of work.
+    Reuses the request session's connection when there is one, otherwise borrows
+    from the pool. Commits on success unless an enclosing transaction() owns the commit.
+    """
+    conn = _session_conn()
+    borrowed = conn is None
+    if borrowed:
+        conn = _pool.acquire()
+    try:
+        yield conn
+        if borrowed or not _local.tx_depth:
+            conn.commit()
+    except Exception:
+        if borrowed or not _local.tx_depth:
+            conn.rollback()
+        raise
+    finally:
+        if borrowed:
+            _pool.release(conn)
 
 
-def init_db():
-    """Initialize database tables."""
-    conn = get_db()
-    conn.executescript("""
+@contextmanager
+def transaction():
+    """Group several model calls into one atomic commit on the session connection."""
+    owns_session = not getattr(_local, "active", False)
+    if owns_session:
+        begin_session()
+    conn = _session_conn()
+    _local.tx_depth += 1
+    try:
+        yield conn
+    except Exception:
+        _local.tx_depth -= 1
+        if not _local.tx_depth:
+            conn.rollback()
+        raise
+    else:
+        _local.tx_depth -= 1
+        if not _local.tx_depth:
+            conn.commit()
+    finally:
+        if not _local.tx_depth:
+            _publish_changes()
+        if owns_session:
+            end_session()
+
+
+def pool_stats():
+    """Connections opened since start-up (a well-sized pool stops growing this)."""
+    return {"backend": backend.name, "opened": _pool.opened, "idle": _pool._idle.qsize()}
+
+
+# ─────────────── SCHEMA ───────────────
+
+# Base tables per backend. SQLite starts at version 0 and replays MIGRATIONS;
+# PostgreSQL databases are created directly at SCHEMA_VERSION["postgresql"].
+SCHEMA = {
+    "sqlite": """
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
@@ -56,41 +201,181 @@ def init_db():
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
-    """)
-    conn.commit()
-    conn.close()
+    """,
+    "postgresql": """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT,
+            email TEXT,
+            display_name TEXT,
+            auth_provider TEXT DEFAULT 'local',
+            created_at TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+        );
+
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER UNIQUE NOT NULL REFERENCES users(id),
+            level TEXT,
+            xp INTEGER DEFAULT 0,
+            current_topic TEXT,
+            current_roadmap TEXT,
+            learning_style TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS learning_history (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            topic TEXT NOT NULL,
+            learning_style TEXT,
+            quiz_score INTEGER,
+            quiz_total INTEGER,
+            timestamp TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+        );
+
+        CREATE TABLE IF NOT EXISTS user_topics (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            topic TEXT NOT NULL,
+            completed_at TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+            UNIQUE (user_id, topic)
+        );
+
+        CREATE TABLE IF NOT EXISTS user_badges (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            badge TEXT NOT NULL,
+            earned_at TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+            UNIQUE (user_id, badge)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_history_user_time ON learning_history(user_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_users_email_provider ON users(email, auth_provider);
+        CREATE INDEX IF NOT EXISTS idx_users_provider_created ON users(auth_provider, created_at);
+        CREATE INDEX IF NOT EXISTS idx_user_topics_topic ON user_topics(topic);
+    """,
+}
+SCHEMA_VERSION = {"sqlite": 0, "postgresql": 2}
+
+
+def init_db():
+    """Initialize database tables."""
+    with get_db() as conn:
+        backend.create_schema(conn, SCHEMA[backend.name], SCHEMA_VERSION[backend.name])
+        _migrate(conn)
+
+
+# Versioned schema changes, applied in order on start-up. The database's current
+# version lives in PRAGMA user_version (SQLite) or the schema_version table;
+# append new entries, never edit old ones. Statements are SQLite unless given as
+# {"sqlite": [...], "postgresql": [...]}; versions 1-2 predate PostgreSQL support.
+MIGRATIONS = [
+    (1, [
+        # get_history: WHERE user_id = ? ORDER BY timestamp DESC
+        "CREATE INDEX IF NOT EXISTS idx_history_user_time ON learning_history(user_id, timestamp)",
+        # social_login: WHERE email = ? AND auth_provider = ?
+        "CREATE INDEX IF NOT EXISTS idx_users_email_provider ON users(email, auth_provider)",
+        # reap_guest_users: WHERE auth_provider = 'guest' AND created_at < ?
+        "CREATE INDEX IF NOT EXISTS idx_users_provider_created ON users(auth_provider, created_at)",
+    ]),
+    (2, [
+        # topics_completed / badges move out of JSON text columns into child tables
+        # (the old columns stay for rollback but are no longer read or written)
+        """CREATE TABLE IF NOT EXISTS user_topics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, topic),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS user_badges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            badge TEXT NOT NULL,
+            earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, badge),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+        # most_completed_topics: GROUP BY topic
+        "CREATE INDEX IF NOT EXISTS idx_user_topics_topic ON user_topics(topic)",
+        """INSERT OR IGNORE INTO user_topics (user_id, topic)
+           SELECT p.user_id, j.value FROM user_progress p, json_each(COALESCE(p.topics_completed, '[]')) j
+           WHERE j.type = 'text' ORDER BY p.user_id, j.key""",
+        """INSERT OR IGNORE INTO user_badges (user_id, badge)
+           SELECT p.user_id, j.value FROM user_progress p, json_each(COALESCE(p.badges, '[]')) j
+           WHERE j.type = 'text' ORDER BY p.user_id, j.key""",
+    ]),
+    (3, [
+        # Bumped by every write to a user's progress, topics, badges or history;
+        # cached dashboard views compare it (a primary-key read) before use
+        "ALTER TABLE user_progress ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (4, [
+        # Guests are reaped by last activity rather than age
+        "ALTER TABLE users ADD COLUMN last_active_at TIMESTAMP",
+        # Legacy guests (created with a password under 'local') become ordinary guests,
+        # so the reaper no longer needs a LIKE on email that defeats its index
+        """UPDATE users SET auth_provider = 'guest'
+           WHERE auth_provider = 'local' AND email LIKE 'guest\\_%@learnsphere.local' ESCAPE '\\'""",
+        "UPDATE users SET last_active_at = created_at WHERE auth_provider = 'guest'",
+        # reap_guest_users: WHERE auth_provider = 'guest' AND last_active_at < ?
+        "CREATE INDEX IF NOT EXISTS idx_users_provider_active ON users(auth_provider, last_active_at)",
+        "DROP INDEX IF EXISTS idx_users_provider_created",
+    ]),
+]
+
+
+def _migrate(conn):
+    """Apply pending MIGRATIONS, each atomically with its version bump."""
+    for version, statements in MIGRATIONS:
+        if isinstance(statements, dict):
+            statements = statements.get(backend.name, [])
+        with backend.migration(conn):
+            # Re-read under the lock so concurrent workers don't double-apply
+            if version > backend.schema_version(conn):
+                for statement in statements:
+                    conn.execute(statement)
+                backend.set_schema_version(conn, version)
+
+
+def schema_version():
+    """Current schema version of the database."""
+    with get_db() as conn:
+        return backend.schema_version(conn)
+
+
+def _utc_timestamp(seconds_ago=0):
+    """UTC time in the format CURRENT_TIMESTAMP stores."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - seconds_ago))
 
 
 # ─────────────── USER MANAGEMENT ───────────────
 
 def create_user(username, password, email="", display_name="", auth_provider="local"):
     """Create a new user. Returns user_id or None if username exists."""
-    conn = get_db()
+    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode() if password else None
     try:
-        pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode() if password else None
-        cursor = conn.execute(
-            "INSERT INTO users (username, password_hash, email, display_name, auth_provider) VALUES (?, ?, ?, ?, ?)",
-            (username, pw_hash, email, display_name or username, auth_provider)
-        )
-        user_id = cursor.lastrowid
-        # Initialize progress
-        conn.execute(
-            "INSERT INTO user_progress (user_id) VALUES (?)",
-            (user_id,)
-        )
-        conn.commit()
-        return user_id
-    except sqlite3.IntegrityError:
+        with get_db() as conn:
+            user_id = conn.execute(
+                "INSERT INTO users (username, password_hash, email, display_name, auth_provider) "
+                "VALUES (?, ?, ?, ?, ?) RETURNING id",
+                (username, pw_hash, email, display_name or username, auth_provider)
+            ).fetchone()["id"]
+            # Initialize progress
+            conn.execute(
+                "INSERT INTO user_progress (user_id) VALUES (?)",
+                (user_id,)
+            )
+            return user_id
+    except backend.IntegrityError:
         return None
-    finally:
-        conn.close()
 
 
 def authenticate_user(username, password):
     """Authenticate user. Returns user dict or None."""
-    conn = get_db()
-    row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-    conn.close()
+    with get_db() as conn:
+        row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
     if row and row["password_hash"]:
         if bcrypt.checkpw(password.encode(), row["password_hash"].encode()):
             return dict(row)
@@ -99,102 +384,501 @@ def authenticate_user(username, password):
 
 def get_user_by_id(user_id):
     """Get user by ID."""
-    conn = get_db()
-    row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-    conn.close()
+    with get_db() as conn:
+        row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
     return dict(row) if row else None
 
 
+def create_guest():
+    """
+    Provision a guest account without password hashing: user and progress rows
+    in one transaction. Returns (user_id, username).
+    """
+    username = "guest_" + uuid.uuid4().hex[:12]
+    with get_db() as conn:
+        user_id = conn.execute(
+            "INSERT INTO users (username, email, display_name, auth_provider, last_active_at) "
+            "VALUES (?, ?, ?, 'guest', ?) RETURNING id",
+            (username, f"{username}@learnsphere.local", "Guest Learner", _utc_timestamp())
+        ).fetchone()["id"]
+        conn.execute("INSERT INTO user_progress (user_id) VALUES (?)", (user_id,))
+    _maybe_reap_guests()
+    return user_id, username
+
+
+_last_reap = 0.0
+
+
+def _maybe_reap_guests():
+    """Run reap_guest_users at most once per GUEST_REAP_INTERVAL per process."""
+    global _last_reap
+    now = time.time()
+    if now - _last_reap >= GUEST_REAP_INTERVAL:
+        _last_reap = now
+        reap_guest_users()
+
+
+def touch_user(user_id):
+    """Record activity for a user. Returns False if the user no longer exists (e.g. a reaped guest)."""
+    with get_db() as conn:
+        return conn.execute(
+            "UPDATE users SET last_active_at = ? WHERE id = ?", (_utc_timestamp(), user_id)
+        ).rowcount > 0
+
+
+# Served by idx_users_provider_active
+_GUEST_IDS = "SELECT id FROM users WHERE auth_provider = 'guest' AND last_active_at < ?"
+
+
+def reap_guest_users(max_age_hours=GUEST_TTL_HOURS):
+    """
+    Delete guest accounts (and their progress/history) with no activity in the
+    last max_age_hours. Returns the number of users removed.
+    """
+    guests = _GUEST_IDS
+    age = _utc_timestamp(max_age_hours * 3600)
+    with transaction() as conn:
+        conn.execute(f"DELETE FROM learning_history WHERE user_id IN ({guests})", (age,))
+        conn.execute(f"DELETE FROM user_topics WHERE user_id IN ({guests})", (age,))
+        conn.execute(f"DELETE FROM user_badges WHERE user_id IN ({guests})", (age,))
+        conn.execute(f"DELETE FROM user_progress WHERE user_id IN ({guests})", (age,))
+        removed = conn.execute(f"DELETE FROM users WHERE id IN ({guests})", (age,)).rowcount
+    if removed:
+        _views.clear()
+    return removed
+
+
+# Served by idx_users_email_provider
+_USER_BY_EMAIL = "SELECT * FROM users WHERE email = ? AND auth_provider = ?"
+
+
 def social_login(email: str, display_name: str, provider: str):
     """Handle social login (Google/Facebook). Creates user if not exists."""
-    conn = get_db()
-    row = conn.execute("SELECT * FROM users WHERE email = ? AND auth_provider = ?", (email, provider)).fetchone()
-    if row:
-        conn.close()
-        return dict(row)
-    # Create new user
-    username = email.split("@")[0] + f"_{provider}"
-    cursor = conn.execute(
-        "INSERT INTO users (username, email, display_name, auth_provider) VALUES (?, ?, ?, ?)",
-        (username, email, display_name, provider)
-    )
-    user_id = cursor.lastrowid
-    conn.execute("INSERT INTO user_progress (user_id) VALUES (?)", (user_id,))
-    conn.commit()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-    conn.close()
-    return dict(user)
+    with get_db() as conn:
+        row = conn.execute(_USER_BY_EMAIL, (email, provider)).fetchone()
+        if row:
+            return dict(row)
+        # Create new user
+        username = email.split("@")[0] + f"_{provider}"
+        user_id = conn.execute(
+            "INSERT INTO users (username, email, display_name, auth_provider) VALUES (?, ?, ?, ?) RETURNING id",
+            (username, email, display_name, provider)
+        ).fetchone()["id"]
+        conn.execute("INSERT INTO user_progress (user_id) VALUES (?)", (user_id,))
+        user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return dict(user)
 
 
 # ─────────────── PROGRESS MANAGEMENT ───────────────
 
 def get_progress(user_id):
-    """Get user progress."""
-    conn = get_db()
-    row = conn.execute("SELECT * FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
-    if row:
-        data: dict = dict(row)
-        data["badges"] = json.loads(data["badges"] or "[]")
-        data["topics_completed"] = json.loads(data["topics_completed"] or "[]")
-        data["current_roadmap"] = json.loads(data["current_roadmap"]) if data["current_roadmap"] else None
-        return data
-    return None
+    """
+    Get user progress (including any buffered quiz outcomes). Served from the
+    cached dashboard view — treat the result as read-only.
+    """
+    view = get_dashboard(user_id)
+    return view["progress"] if view else None
+
+
+_BUMP_VERSION = "UPDATE user_progress SET version = version + 1 WHERE user_id = ?"
+
+# List-valued progress fields and the child table (table, column) holding each
+_PROGRESS_SETS = {
+    "topics_completed": ("user_topics", "topic"),
+    "badges": ("user_badges", "badge"),
+}
 
 
 def save_progress(user_id: int, **kwargs):
-    """Update user progress fields."""
-    conn = get_db()
+    """
+    Update user progress fields. topics_completed / badges replace the stored
+    set: missing entries are inserted, entries not in the new list removed.
+    """
     fields: list = []
     values: list = []
+    sets = {}
     for key, val in kwargs.items():
-        if key in ("level", "xp", "badges", "topics_completed", "current_topic", "current_roadmap", "learning_style"):
+        if key in _PROGRESS_SETS:
+            sets[key] = list(dict.fromkeys(val or []))
+        elif key in ("level", "xp", "current_topic", "current_roadmap", "learning_style"):
             fields.append(f"{key} = ?")
-            if key in ("badges", "topics_completed"):
-                values.append(json.dumps(val))
-            elif key == "current_roadmap":
+            if key == "current_roadmap":
                 values.append(json.dumps(val) if val else None)
             else:
                 values.append(val)
-    if fields:
-        values.append(user_id)
-        conn.execute(f"UPDATE user_progress SET {', '.join(fields)} WHERE user_id = ?", values)
-        conn.commit()
-    conn.close()
+    if not fields and not sets:
+        return
+    with get_db() as conn:
+        # The UPDATE comes first so the write lock is held before the set sync
+        fields.append("version = version + 1")
+        if not conn.execute(f"UPDATE user_progress SET {', '.join(fields)} WHERE user_id = ?",
+                            values + [user_id]).rowcount:
+            return  # no such user (e.g. a reaped guest): don't write orphan rows
+        for key, items in sets.items():
+            table, column = _PROGRESS_SETS[key]
+            keep = f" AND {column} NOT IN ({', '.join('?' * len(items))})" if items else ""
+            conn.execute(f"DELETE FROM {table} WHERE user_id = ?{keep}", (user_id, *items))
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {table} (user_id, {column}) VALUES (?, ?)",
+                [(user_id, item) for item in items]
+            )
+    _changed(user_id)
+
+
+def complete_topic(user_id, topic):
+    """Mark a topic completed (no-op if it already is)."""
+    with get_db() as conn:
+        if conn.execute(_BUMP_VERSION, (user_id,)).rowcount:
+            conn.execute("INSERT OR IGNORE INTO user_topics (user_id, topic) VALUES (?, ?)", (user_id, topic))
+    _changed(user_id)
+
+
+def award_badge(user_id, badge):
+    """Give a user a badge (no-op if they already have it)."""
+    with get_db() as conn:
+        if conn.execute(_BUMP_VERSION, (user_id,)).rowcount:
+            conn.execute("INSERT OR IGNORE INTO user_badges (user_id, badge) VALUES (?, ?)", (user_id, badge))
+    _changed(user_id)
+
+
+def most_completed_topics(limit=10):
+    """Topics completed by the most learners: [(topic, learners)], via the topic index."""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT topic, COUNT(*) AS learners FROM user_topics GROUP BY topic ORDER BY learners DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    return [(r["topic"], r["learners"]) for r in rows]
 
 
 def add_xp(user_id, points):
     """Add XP to user."""
-    conn = get_db()
-    conn.execute("UPDATE user_progress SET xp = xp + ? WHERE user_id = ?", (points, user_id))
-    conn.commit()
-    row = conn.execute("SELECT xp FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
+    with get_db() as conn:
+        conn.execute(_ADD_XP, (points, user_id))
+        row = conn.execute("SELECT xp FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
+    _changed(user_id)
+    return (row["xp"] if row else 0) + _outcomes.pending_xp(user_id)
+
+
+# ─────────────── QUIZ OUTCOMES ───────────────
+
+_ADD_XP = "UPDATE user_progress SET xp = xp + ?, version = version + 1 WHERE user_id = ?"
+# The unique (user_id, topic) key makes completion idempotent under concurrent submissions
+_COMPLETE_TOPIC = "INSERT OR IGNORE INTO user_topics (user_id, topic) VALUES (?, ?)"
+_INSERT_HISTORY = (
+    "INSERT INTO learning_history (user_id, topic, learning_style, quiz_score, quiz_total, timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def record_evaluation(user_id, topic, quiz_score, quiz_total, xp_earned, learning_style=None):
+    """
+    Apply a quiz outcome — history row, XP delta and topic completion — as one
+    atomic write (or hand it to the write-behind buffer when XP_WRITE_BEHIND is on).
+    Returns the user's new XP total.
+    """
+    if XP_WRITE_BEHIND:
+        _outcomes.add(user_id, topic, learning_style, quiz_score, quiz_total, xp_earned)
+        _changed(user_id)
+        with get_db() as conn:
+            row = conn.execute("SELECT xp FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
+        return (row["xp"] if row else 0) + _outcomes.pending_xp(user_id)
+
+    with transaction() as conn:
+        # The UPDATE comes first so the write lock is held before anything is read;
+        # it also tells us whether the user still exists
+        if conn.execute(_ADD_XP, (xp_earned, user_id)).rowcount:
+            conn.execute(_COMPLETE_TOPIC, (user_id, topic))
+            conn.execute(_INSERT_HISTORY, (user_id, topic, learning_style, quiz_score, quiz_total, _utc_timestamp()))
+        row = conn.execute("SELECT xp FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
+    _changed(user_id)
     return row["xp"] if row else 0
 
 
+class OutcomeBuffer:
+    """
+    Write-behind buffer for quiz outcomes. Bursts of submissions are coalesced
+    per user (XP summed, topics de-duplicated, history rows kept with their
+    submit time) and written by a background thread in one transaction per flush.
+    Reads overlay whatever is still pending.
+    """
+
+    def __init__(self, interval=XP_FLUSH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> {"xp": int, "topics": [str], "history": [tuple]}
+        self._thread = None
+        self.flushes = 0
+
+    def add(self, user_id, topic, learning_style, quiz_score, quiz_total, xp):
+        submitted = _utc_timestamp()
+        with self._lock:
+            entry = self._pending.setdefault(user_id, {"xp": 0, "topics": [], "history": []})
+            entry["xp"] += xp
+            if topic not in entry["topics"]:
+                entry["topics"].append(topic)
+            entry["history"].append((topic, learning_style, quiz_score, quiz_total, submitted))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="outcome-flush", daemon=True)
+                self._thread.start()
+
+    def pending_xp(self, user_id):
+        with self._lock:
+            entry = self._pending.get(user_id)
+            return entry["xp"] if entry else 0
+
+    def overlay_progress(self, user_id, progress):
+        with self._lock:
+            entry = self._pending.get(user_id)
+            if entry:
+                progress["xp"] = (progress.get("xp") or 0) + entry["xp"]
+                for topic in entry["topics"]:
+                    if topic not in progress["topics_completed"]:
+                        progress["topics_completed"].append(topic)
+
+    def pending_history(self, user_id):
+        """Buffered history rows for a user, newest first, shaped like get_history rows."""
+        with self._lock:
+            entry = self._pending.get(user_id)
+            rows = list(entry["history"]) if entry else []
+        return [
+            {"id": None, "user_id": user_id, "topic": topic, "learning_style": style,
+             "quiz_score": score, "quiz_total": total, "timestamp": submitted}
+            for topic, style, score, total, submitted in reversed(rows)
+        ]
+
+    def flush(self):
+        """Write everything pending in one transaction. Returns the number of outcomes written."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            with get_db() as conn:
+                for user_id, entry in batch.items():
+                    if not conn.execute(_ADD_XP, (entry["xp"], user_id)).rowcount:
+                        continue  # user reaped since; drop their outcomes
+                    conn.executemany(_COMPLETE_TOPIC, [(user_id, topic) for topic in entry["topics"]])
+                    conn.executemany(_INSERT_HISTORY, [(user_id, *row) for row in entry["history"]])
+        except Exception:
+            self._requeue(batch)
+            raise
+        # Values are unchanged, but a view built mid-flush may have missed them
+        for user_id in batch:
+            _views.invalidate(user_id)
+        self.flushes += 1
+        return sum(len(entry["history"]) for entry in batch.values())
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front of anything added since."""
+        with self._lock:
+            for user_id, entry in batch.items():
+                newer = self._pending.get(user_id)
+                if newer:
+                    entry["xp"] += newer["xp"]
+                    entry["topics"] += [t for t in newer["topics"] if t not in entry["topics"]]
+                    entry["history"] += newer["history"]
+                self._pending[user_id] = entry
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except backend.Error:
+                pass  # requeued; retried on the next tick
+
+
+_outcomes = OutcomeBuffer()
+atexit.register(_outcomes.flush)
+
+
 # ─────────────── HISTORY MANAGEMENT ───────────────
 
 def add_history(user_id, topic, learning_style=None, quiz_score=None, quiz_total=None):
     """Add a learning history entry."""
-    conn = get_db()
-    conn.execute(
-        "INSERT INTO learning_history (user_id, topic, learning_style, quiz_score, quiz_total) VALUES (?, ?, ?, ?, ?)",
-        (user_id, topic, learning_style, quiz_score, quiz_total)
-    )
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        if not conn.execute(_BUMP_VERSION, (user_id,)).rowcount:
+            return
+        conn.execute(
+            "INSERT INTO learning_history (user_id, topic, learning_style, quiz_score, quiz_total) VALUES (?, ?, ?, ?, ?)",
+            (user_id, topic, learning_style, quiz_score, quiz_total)
+        )
+    _changed(user_id)
+
+
+# Served by idx_history_user_time
+_HISTORY_PAGE = "SELECT * FROM learning_history WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?"
 
 
 def get_history(user_id, limit=20):
-    """Get learning history for a user."""
-    conn = get_db()
-    rows = conn.execute(
-        "SELECT * FROM learning_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
-        (user_id, limit)
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    """Get learning history for a user (the latest DASHBOARD_HISTORY rows come from the cached view)."""
+    if limit <= DASHBOARD_HISTORY:
+        view = get_dashboard(user_id)
+        if view:
+            return view["history"][:limit]
+    with get_db() as conn:
+        rows = conn.execute(_HISTORY_PAGE, (user_id, limit)).fetchall()
+    return (_outcomes.pending_history(user_id) + [dict(r) for r in rows])[:limit]
+
+
+# ─────────────── DASHBOARD VIEW ───────────────
+
+# Progress, badges, completed topics and recent history in one round trip
+# (the lists come back as JSON text)
+_DASHBOARD_QUERY = {
+    "sqlite": f"""
+        SELECT p.id, p.user_id, p.level, p.xp, p.current_topic, p.current_roadmap, p.learning_style, p.version,
+            (SELECT json_group_array(badge) FROM
+                (SELECT badge FROM user_badges WHERE user_id = p.user_id ORDER BY id)) AS badges,
+            (SELECT json_group_array(topic) FROM
+                (SELECT topic FROM user_topics WHERE user_id = p.user_id ORDER BY id)) AS topics_completed,
+            (SELECT json_group_array(json_object(
+                    'id', id, 'user_id', user_id, 'topic', topic, 'learning_style', learning_style,
+                    'quiz_score', quiz_score, 'quiz_total', quiz_total, 'timestamp', timestamp)) FROM
+                (SELECT * FROM learning_history WHERE user_id = p.user_id
+                 ORDER BY timestamp DESC, id DESC LIMIT {DASHBOARD_HISTORY})) AS history
+        FROM user_progress p WHERE p.user_id = ?
+    """,
+    "postgresql": f"""
+        SELECT p.id, p.user_id, p.level, p.xp, p.current_topic, p.current_roadmap, p.learning_style, p.version,
+            (SELECT json_agg(b.badge ORDER BY b.id)::text FROM user_badges b
+                WHERE b.user_id = p.user_id) AS badges,
+            (SELECT json_agg(t.topic ORDER BY t.id)::text FROM user_topics t
+                WHERE t.user_id = p.user_id) AS topics_completed,
+            (SELECT json_agg(json_build_object(
+                    'id', h.id, 'user_id', h.user_id, 'topic', h.topic, 'learning_style', h.learning_style,
+                    'quiz_score', h.quiz_score, 'quiz_total', h.quiz_total,
+                    'timestamp', to_char(h.timestamp, 'YYYY-MM-DD HH24:MI:SS'))
+                    ORDER BY h.timestamp DESC, h.id DESC)::text FROM
+                (SELECT * FROM learning_history WHERE user_id = p.user_id
+                 ORDER BY timestamp DESC, id DESC LIMIT {DASHBOARD_HISTORY}) h) AS history
+        FROM user_progress p WHERE p.user_id = ?
+    """,
+}
+
+
+class DashboardViews:
+    """
+    LRU of per-user dashboard views. Local writes invalidate a view when they
+    commit, so within `revalidate` seconds of its last check a view is served
+    without touching the database; after that it is reused only if its
+    version still matches the database's, which picks up writes made by other
+    processes. A load only lands if no local write invalidated the user while
+    it was running, so a slow reader can't cache stale rows.
+    """
+
+    def __init__(self, size=DASHBOARD_CACHE_USERS, revalidate=DASHBOARD_REVALIDATE):
+        self.size = size
+        self.revalidate = revalidate
+        self._views = OrderedDict()  # user_id -> (view, checked_at)
+        self._loading = {}  # user_id -> token of the load allowed to store
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.checks = 0
+
+    def get(self, user_id, load, current_version):
+        """
+        `load(user_id)` builds a view (with a "version"); `current_version(user_id)`
+        is the cheap check run before a view older than `revalidate` is reused.
+        """
+        now = time.monotonic()
+        with self._lock:
+            view, checked_at = self._views.get(user_id, (None, 0))
+        if view is not None:
+            fresh = now - checked_at < self.revalidate
+            if not fresh:
+                with self._lock:
+                    self.checks += 1
+                fresh = current_version(user_id) == view["version"]
+                checked_at = now
+            if fresh:
+                with self._lock:
+                    if self._views.get(user_id, (None,))[0] is view:
+                        self._views[user_id] = (view, checked_at)
+                        self._views.move_to_end(user_id)
+                    self.hits += 1
+                return view
+        with self._lock:
+            self.misses += 1
+            token = self._loading[user_id] = object()
+        view = load(user_id)
+        with self._lock:
+            if view is not None and self._loading.get(user_id) is token:
+                del self._loading[user_id]
+                self._views[user_id] = (view, now)
+                while len(self._views) > self.size:
+                    self._views.popitem(last=False)
+        return view
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._views.pop(user_id, None)
+            self._loading.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+            self._loading.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._views), "hits": self.hits, "misses": self.misses,
+                    "version_checks": self.checks}
+
+
+_views = DashboardViews()
+
+
+def _changed(user_id):
+    """Invalidate a user's view once the write is committed (at the end of an enclosing transaction())."""
+    if getattr(_local, "tx_depth", 0):
+        _local.changed.add(user_id)
+    else:
+        _views.invalidate(user_id)
+
+
+def _publish_changes():
+    changed = getattr(_local, "changed", None)
+    while changed:
+        _views.invalidate(changed.pop())
+
+
+def _load_dashboard(user_id):
+    with get_db() as conn:
+        row = conn.execute(_DASHBOARD_QUERY[backend.name], (user_id,)).fetchone()
+    if not row:
+        return None
+    progress: dict = dict(row)
+    version = progress.pop("version")
+    history = json.loads(progress.pop("history") or "[]")
+    progress["badges"] = json.loads(progress["badges"] or "[]")
+    progress["topics_completed"] = json.loads(progress["topics_completed"] or "[]")
+    progress["current_roadmap"] = json.loads(progress["current_roadmap"]) if progress["current_roadmap"] else None
+    _outcomes.overlay_progress(user_id, progress)
+    history = (_outcomes.pending_history(user_id) + history)[:DASHBOARD_HISTORY]
+    body = json.dumps([progress, history], sort_keys=True, default=str).encode("utf-8")
+    return {"progress": progress, "history": history, "version": version,
+            "etag": hashlib.sha1(body).hexdigest()[:20]}
+
+
+def _progress_version(user_id):
+    with get_db() as conn:
+        row = conn.execute("SELECT version FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
+    return row["version"] if row else None
+
+
+def get_dashboard(user_id):
+    """
+    Cached view {"progress", "history", "version", "etag"} for a user, or None
+    if they have no progress row. A recently checked view costs no database
+    access, an older one a primary-key version read; the etag changes
+    whenever the progress or history does.
+    """
+    return _views.get(user_id, _load_dashboard, _progress_version)
+
+
+def dashboard_stats():
+    return _views.stats()
 
 
 # Initialize DB on import
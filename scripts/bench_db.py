@@ -0,0 +1,116 @@
+"""
+LearnSphere — Micro-benchmark for the models.py connection pool.
+
+Replays a learner's request (read progress, record a quiz evaluation, read
+history) against a scratch database, once opening a connection per model call
+as get_db() did before pooling and once with the pooled per-request session
+the app uses, and reports new connections per request and latency.
+
+    python scripts/bench_db.py
+    python scripts/bench_db.py --requests 2000 --threads 8
+    python scripts/bench_db.py --url postgresql://postgres@localhost:5432/learnsphere_test
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class Unpooled:
+    """What get_db() did before pooling: a fresh connection for every model call."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self):
+        with self._lock:
+            self.opened += 1
+        return self._factory()
+
+    def release(self, conn):
+        conn.close()
+
+
+def learner_request(models, user_id, n):
+    models.get_progress(user_id)
+    models.record_evaluation(user_id, f"Topic {n % 20}", quiz_score=2, quiz_total=3, xp_earned=40)
+    models.get_history(user_id)
+
+
+def run_mode(models, mode, args):
+    pooled = mode == "pooled"
+    models._pool = models.ConnectionPool(models.backend.connect, models.DB_POOL_SIZE) if pooled \
+        else Unpooled(models.backend.connect)
+    users = [models.create_guest()[0] for _ in range(args.threads)]
+    opened_before = models._pool.opened
+    latencies = []
+    lock = threading.Lock()
+    per_thread = args.requests // args.threads
+
+    def worker(user_id):
+        mine = []
+        for n in range(per_thread):
+            started = time.perf_counter()
+            if pooled:
+                models.begin_session()
+            try:
+                learner_request(models, user_id, n)
+            finally:
+                if pooled:
+                    models.end_session()
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pct = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)
+    return {
+        "mode": mode,
+        "backend": models.backend.name,
+        "threads": args.threads,
+        "requests": len(latencies),
+        "connections_per_request": round((models._pool.opened - opened_before) / len(latencies), 2),
+        "connections_opened": models._pool.opened - opened_before,
+        "rps": round(len(latencies) / elapsed),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL", ""),
+                        help="DATABASE_URL to benchmark (default: a temporary SQLite file)")
+    parser.add_argument("--modes", default="per-call,pooled", help="comma-separated: per-call, pooled")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    # Measure the database writes themselves, not the XP write-behind buffer
+    os.environ["XP_WRITE_BEHIND"] = "0"
+    import models  # noqa: E402 — reads DATABASE_URL on import
+
+    for mode in args.modes.split(","):
+        print(json.dumps(run_mode(models, mode.strip(), args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+LearnSphere — Storage conformance checks for the models.py backends.
+
+Runs the same checks against whichever database DATABASE_URL selects, so the
+SQLite and PostgreSQL backends can be compared. Use an empty scratch database:
+the checks create users and reap guests.
+
+    python scripts/check_storage.py                      # temporary SQLite file
+    python scripts/check_storage.py --url postgresql://postgres@localhost:5432/learnsphere_test
+    python scripts/check_storage.py --write-behind       # with XP_WRITE_BEHIND=1
+
+concurrent_evaluations always runs with write-behind both off and on.
+
+A throwaway PostgreSQL:  docker run --rm -p 5432:5432 -e POSTGRES_HOST_AUTH_METHOD=trust postgres:16
+"""
+
+import os
+import sys
+import uuid
+import argparse
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHECKS = []
+
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+
+def unique(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+
+
+@check
+def users(models):
+    name = unique("user")
+    user_id = models.create_user(name, "secret", email=f"{name}@example.com")
+    assert isinstance(user_id, int)
+    assert models.create_user(name, "other") is None, "duplicate username must return None"
+    user = models.authenticate_user(name, "secret")
+    assert user and user["id"] == user_id and user["display_name"] == name
+    assert models.authenticate_user(name, "wrong") is None
+    assert models.get_user_by_id(user_id)["username"] == name
+    assert len(user["created_at"]) == 19, f"created_at should be 'YYYY-MM-DD HH:MM:SS', got {user['created_at']!r}"
+
+
+@check
+def social_login(models):
+    email = f"{unique('social')}@example.com"
+    first = models.social_login(email, "Social User", "google")
+    again = models.social_login(email, "Social User", "google")
+    assert first["id"] == again["id"]
+    assert models.get_progress(first["id"])["xp"] == 0
+
+
+@check
+def progress_shape(models):
+    user_id, username = models.create_guest()
+    assert username.startswith("guest_")
+    progress = models.get_progress(user_id)
+    assert set(progress) == {"id", "user_id", "level", "xp", "current_topic", "current_roadmap",
+                             "learning_style", "badges", "topics_completed"}
+    assert progress["badges"] == [] and progress["topics_completed"] == [] and progress["current_roadmap"] is None
+    assert models.get_progress(10 ** 9) is None
+
+
+@check
+def save_progress(models):
+    user_id, _ = models.create_guest()
+    roadmap = [{"id": 1, "title": "Linear Regression", "icon": "📈"}]
+    models.save_progress(user_id, level="Advanced", current_roadmap=roadmap, learning_style="Code",
+                         topics_completed=["A", "B", "A"], badges=["first"])
+    progress = models.get_progress(user_id)
+    assert progress["level"] == "Advanced" and progress["current_roadmap"] == roadmap
+    assert progress["topics_completed"] == ["A", "B"] and progress["badges"] == ["first"]
+    models.save_progress(user_id, topics_completed=["B", "C"], badges=[])
+    progress = models.get_progress(user_id)
+    assert progress["topics_completed"] == ["B", "C"] and progress["badges"] == []
+    models.complete_topic(user_id, "C")
+    models.award_badge(user_id, "streak")
+    models.award_badge(user_id, "streak")
+    progress = models.get_progress(user_id)
+    assert progress["topics_completed"] == ["B", "C"] and progress["badges"] == ["streak"]
+
+
+@check
+def xp_and_history(models):
+    user_id, _ = models.create_guest()
+    assert models.add_xp(user_id, 15) == 15
+    models.add_history(user_id, "Intro", learning_style="Reading")
+    total = models.record_evaluation(user_id, "Trees", quiz_score=2, quiz_total=3, xp_earned=40)
+    assert total == 55
+    models._outcomes.flush()
+    history = models.get_history(user_id)
+    assert [h["topic"] for h in history] == ["Trees", "Intro"], history
+    assert history[0]["quiz_score"] == 2 and history[0]["quiz_total"] == 3
+    assert models.get_history(user_id, limit=1)[0]["topic"] == "Trees"
+    assert models.get_history(user_id, limit=100) == history
+    assert models.get_progress(user_id)["topics_completed"] == ["Trees"]
+
+
+@check
+def dashboard(models):
+    user_id, _ = models.create_guest()
+    before = models.get_dashboard(user_id)
+    assert models.get_dashboard(user_id)["etag"] == before["etag"]
+    models.add_xp(user_id, 5)
+    after = models.get_dashboard(user_id)
+    assert after["etag"] != before["etag"] and after["progress"]["xp"] == 5
+
+
+@check
+def concurrent_evaluations(models):
+    """40 simultaneous quiz submissions lose no XP, topic or history row, with write-behind off and on."""
+    configured = models.XP_WRITE_BEHIND
+    try:
+        for write_behind in (False, True):
+            models.XP_WRITE_BEHIND = write_behind
+            _concurrent_evaluations(models, write_behind)
+    finally:
+        models.XP_WRITE_BEHIND = configured
+
+
+def _concurrent_evaluations(models, write_behind):
+    mode = f"write-behind {'on' if write_behind else 'off'}"
+    user_id, _ = models.create_guest()
+    topics = [f"T{i % 5}" for i in range(40)]
+    totals = []
+
+    def submit(topic):
+        models.begin_session()
+        try:
+            totals.append(models.record_evaluation(user_id, topic, quiz_score=1, quiz_total=3, xp_earned=10))
+        finally:
+            models.end_session()
+
+    threads = [threading.Thread(target=submit, args=(topic,)) for topic in topics]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if write_behind:
+        # Returned totals are only a display value here; the buffer must hold every increment
+        assert models.get_progress(user_id)["xp"] == 400, f"{mode}: buffered XP not visible before flush"
+    else:
+        # Every submission saw its own increment: the returned totals are 10, 20, ... 400
+        assert sorted(totals) == list(range(10, 410, 10)), f"{mode}: totals {sorted(totals)}"
+    models._outcomes.flush()
+    progress = models.get_progress(user_id)
+    assert progress["xp"] == 400, f"{mode}: xp {progress['xp']}"
+    assert sorted(progress["topics_completed"]) == sorted(set(topics)), f"{mode}: {progress['topics_completed']}"
+    assert len(models.get_history(user_id, limit=100)) == 40, mode
+
+
+@check
+def reap_guests(models):
+    user_id, _ = models.create_guest()
+    models.save_progress(user_id, topics_completed=["A"], badges=["b"])
+    models.add_history(user_id, "A")
+    assert models.reap_guest_users(max_age_hours=-1) >= 1
+    assert models.get_user_by_id(user_id) is None and models.get_progress(user_id) is None
+    assert models.get_history(user_id) == []
+
+
+def query_plan(models, sql, params):
+    """The planner's plan for one statement, as text."""
+    with models.get_db() as conn:
+        if models.backend.name == "sqlite":
+            return "\n".join(row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        # The check tables are tiny, so make PostgreSQL show the index it would use at scale
+        conn.execute("SET LOCAL enable_seqscan = off")
+        return "\n".join(row["QUERY PLAN"] for row in conn.execute("EXPLAIN " + sql, params))
+
+
+@check
+def query_plans(models):
+    expected = [
+        ("get_history", models._HISTORY_PAGE, (1, 20), "idx_history_user_time"),
+        ("social_login", models._USER_BY_EMAIL, ("a@example.com", "google"), "idx_users_email_provider"),
+        ("reap_guest_users", models._GUEST_IDS, (models._utc_timestamp(),), "idx_users_provider_active"),
+    ]
+    for name, sql, params, index in expected:
+        plan = query_plan(models, sql, params)
+        assert index in plan, f"{name} should use {index}, plan was: {plan}"
+
+
+@check
+def schema(models):
+    assert models.schema_version() == max(version for version, _ in models.MIGRATIONS)
+    models.init_db()  # idempotent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL", ""),
+                        help="DATABASE_URL to check (default: a temporary SQLite file)")
+    parser.add_argument("--write-behind", action="store_true", help="run with XP_WRITE_BEHIND=1")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check.db")
+    os.environ["XP_WRITE_BEHIND"] = "1" if args.write_behind else "0"
+    import models  # noqa: E402 — reads DATABASE_URL on import
+
+    print(f"backend: {models.backend.name}  write-behind: {models.XP_WRITE_BEHIND}")
+    failures = 0
+    for fn in CHECKS:
+        try:
+            fn(models)
+            print(f"  ok    {fn.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"  FAIL  {fn.__name__}: {type(e).__name__}: {e}")
+    print(f"{len(CHECKS) - failures}/{len(CHECKS)} passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+LearnSphere — Offline evaluation of the local level detector (utils/level_utils.py).
+
+Reports accuracy, a confusion matrix, how many questions clear the confidence
+threshold (i.e. skip the LLM) and the accuracy on those, plus per-call latency,
+for each labelled split:
+
+    level_questions.jsonl          the cues are tuned on this
+    level_questions_holdout.jsonl  LEVEL_CONFIDENCE is chosen on this
+    level_questions_test.jsonl     never tuned against; the numbers to quote
+
+    python scripts/eval_level_detector.py
+    python scripts/eval_level_detector.py --data scripts/data/level_questions_holdout.jsonl
+    python scripts/eval_level_detector.py --threshold 0.7 --show-errors
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.level_utils import LEVELS, LEVEL_CONFIDENCE, classify_level  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, "scripts", "data")
+SPLITS = [
+    os.path.join(DATA_DIR, "level_questions.jsonl"),          # tuning set
+    os.path.join(DATA_DIR, "level_questions_holdout.jsonl"),  # threshold selection
+    os.path.join(DATA_DIR, "level_questions_test.jsonl"),     # untouched test set
+]
+
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(path, threshold, show_errors):
+    rows = load(path)
+    confusion = {actual: {predicted: 0 for predicted in LEVELS} for actual in LEVELS}
+    correct = confident = confident_correct = 0
+    errors = []
+
+    started = time.perf_counter()
+    predictions = [classify_level(row["question"]) for row in rows]
+    per_call_us = (time.perf_counter() - started) / len(rows) * 1e6
+
+    for row, (level, confidence) in zip(rows, predictions):
+        confusion[row["level"]][level] += 1
+        hit = level == row["level"]
+        correct += hit
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += hit
+        if not hit:
+            errors.append((row["level"], level, confidence, row["question"]))
+
+    print(f"== {os.path.relpath(path, ROOT)}")
+    print(f"questions:            {len(rows)}")
+    print(f"accuracy:             {correct / len(rows):.1%}")
+    print(f"confident (>= {threshold:.2f}):   {confident / len(rows):.1%} of questions skip the LLM")
+    if confident:
+        print(f"accuracy when confident: {confident_correct / confident:.1%}")
+    print(f"latency:              {per_call_us:.1f} µs per question")
+    print()
+    print("actual \\ predicted   " + "".join(f"{lvl:>14}" for lvl in LEVELS))
+    for actual in LEVELS:
+        print(f"{actual:<21}" + "".join(f"{confusion[actual][p]:>14}" for p in LEVELS))
+
+    if show_errors:
+        print()
+        for actual, predicted, confidence, question in errors:
+            print(f"[{actual} -> {predicted} @ {confidence:.2f}] {question}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", nargs="+", default=SPLITS, help="labelled JSONL files (default: both splits)")
+    parser.add_argument("--threshold", type=float, default=LEVEL_CONFIDENCE)
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    for path in args.data:
+        evaluate(path, args.threshold, args.show_errors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+LearnSphere — Load test for the serving modes in serve.py.
+
+Starts the server against the fake LLM backend (fixed upstream latency, no
+network), keeps N requests in flight against an LLM-bound route, and reports
+requests/second, latency and resident memory per concurrent request.
+
+    python scripts/loadtest.py --concurrency 200
+    python scripts/loadtest.py --modes gevent --concurrency 500 --latency 2
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_kb(pid):
+    """Resident set size of a process in KB (Linux)."""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def post(port, path, body, timeout):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_mode(mode, args):
+    port = args.port
+    env = dict(
+        os.environ,
+        LLM_BACKEND="fake",
+        FAKE_LLM_LATENCY=str(args.latency),
+        LLM_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "cache.db"),
+        PORT=str(port),
+    )
+    command = [sys.executable, os.path.join(ROOT, "serve.py")] + (["--gevent"] if mode == "gevent" else [])
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        post(port, "/api/concept-flow", {"topic": "warm-up"}, timeout=60)
+        baseline = rss_kb(server.pid)
+
+        latencies, errors = [], [0]
+        peak = [baseline]
+        lock = threading.Lock()
+        counter = iter(range(10 ** 9))
+        stop_at = time.time() + args.duration
+
+        def worker():
+            while time.time() < stop_at:
+                # Unique topics so neither the response cache nor single-flight absorbs the load
+                topic = f"Topic {next(counter)}"
+                started = time.time()
+                try:
+                    ok = post(port, "/api/concept-flow", {"topic": topic}, timeout=120) == 200
+                except OSError:
+                    ok = False
+                with lock:
+                    if ok:
+                        latencies.append(time.time() - started)
+                    else:
+                        errors[0] += 1
+
+        def sample_memory():
+            while time.time() < stop_at:
+                peak[0] = max(peak[0], rss_kb(server.pid))
+                time.sleep(0.2)
+
+        started = time.time()
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        threads.append(threading.Thread(target=sample_memory))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.time() - started
+
+        latencies.sort()
+        pct = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000) if latencies else None
+        return {
+            "mode": mode,
+            "concurrency": args.concurrency,
+            "requests": len(latencies),
+            "errors": errors[0],
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "rss_baseline_mb": round(baseline / 1024, 1),
+            "rss_peak_mb": round(peak[0] / 1024, 1),
+            "kb_per_concurrent_request": round((peak[0] - baseline) / args.concurrency, 1),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="threaded,gevent", help="comma-separated: threaded, gevent")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15, help="seconds of sustained load per mode")
+    parser.add_argument("--latency", type=float, default=1.0, help="fake upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        print(json.dumps(run_mode(mode.strip(), args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+LearnSphere — Server entry point.
+
+    python serve.py                 # threaded WSGI server: one OS thread per in-flight request
+    python serve.py --gevent        # cooperative server: one process holds hundreds of
+                                    # requests waiting on Cerebras, Gemini, edge-tts or YouTube
+
+The --gevent mode patches the standard library before the app is imported, so the
+existing blocking code (the Cerebras SDK's HTTP client, urllib, thread pools,
+thread-locals) yields to other requests while it waits on the network.
+"""
+
+import os
+import sys
+
+# Must run before anything imports socket/threading
+if "--gevent" in sys.argv:
+    try:
+        from gevent import monkey
+    except ImportError:
+        sys.exit("gevent is not installed: pip install gevent")
+    monkey.patch_all()
+
+import argparse
+
+
+GEVENT_MAX_CONNECTIONS = int(os.getenv("GEVENT_MAX_CONNECTIONS", "1000"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LearnSphere server")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    parser.add_argument("--gevent", action="store_true", help="serve with gevent instead of OS threads")
+    args = parser.parse_args()
+
+    from app import app
+
+    if args.gevent:
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        print(f"🧠 LearnSphere (gevent) on http://{args.host}:{args.port}")
+        WSGIServer((args.host, args.port), app, spawn=Pool(GEVENT_MAX_CONNECTIONS), log=None).serve_forever()
+    else:
+        from werkzeug.serving import make_server
+        print(f"🧠 LearnSphere (threaded) on http://{args.host}:{args.port}")
+        make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -195,6 +195,28 @@ async function selectStyle(style) {
     document.getElementById('videoContainer').style.display = 'none';
     showLoader('contentArea', `Generating your ${style.toLowerCase()} content...`);
 
+    if (style !== 'Auditory') {
+        // Markdown styles stream token by token
+        let text = '';
+        try {
+            await streamEvents('/api/content', { topic: state.currentTopicTitle, level: state.level, style, stream: true }, (event, data) => {
+                if (event === 'token') {
+                    text += data.text;
+                    scheduleRender(() => { contentArea.innerHTML = renderMarkdown(text); });
+                } else if (event === 'done') {
+                    contentArea.innerHTML = renderMarkdown(text);
+                    if (data.videos && data.videos.length) renderVideos(data.videos);
+                } else if (event === 'error') {
+                    throw new Error(data.error);
+                }
+            });
+            state.content = text;
+        } catch (err) {
+            contentArea.innerHTML = '<div style="text-align:center;color:#ff5252;">❌ Failed to generate content. Please try again.</div>';
+        }
+        return;
+    }
+
     try {
         const res = await fetch('/api/content', {
             method: 'POST',
@@ -208,23 +230,16 @@ async function selectStyle(style) {
             contentArea.innerHTML = renderMarkdown(data.content);
             const audioContainer = document.getElementById('audioPlayerContainer');
             const audioPlayer = document.getElementById('audioPlayer');
-            if (data.audio_path) {
-                audioPlayer.src = data.audio_path;
-                audioContainer.style.display = 'block';
+            if (data.audio_job) {
+                const audioPath = await pollAudioJob(data.audio_job);
+                if (audioPath && state.learningStyle === 'Auditory') {
+                    audioPlayer.src = audioPath;
+                    audioContainer.style.display = 'block';
+                }
             }
         } else if (data.type === 'visual') {
             contentArea.innerHTML = renderMarkdown(data.content);
-            if (data.videos && data.videos.length) {
-                const vc = document.getElementById('videoContainer');
-                vc.style.display = 'block';
-                vc.innerHTML = '<h3 style="margin-bottom:12px;">🎬 Video Tutorials</h3><div class="video-grid">' +
-                    data.videos.map(v => {
-                        if (v.is_search_link) {
-                            return `<div class="video-card"><div class="video-title"><a href="${v.url}" target="_blank" style="color:var(--accent-blue);">🔗 ${v.title}</a></div></div>`;
-                        }
-                        return `<div class="video-card"><iframe src="https://www.youtube.com/embed/${v.video_id}" allowfullscreen></iframe><div class="video-title">${v.title}</div></div>`;
-                    }).join('') + '</div>';
-            }
+            if (data.videos && data.videos.length) renderVideos(data.videos);
         } else {
             contentArea.innerHTML = renderMarkdown(data.content);
         }
@@ -234,6 +249,33 @@ async function selectStyle(style) {
     }
 }
 
+/**
+ * Poll a background TTS job until it finishes.
+ * Resolves to the audio URL, or null if synthesis failed.
+ */
+async function pollAudioJob(jobId, intervalMs = 1500) {
+    while (true) {
+        const res = await fetch(`/api/audio/${jobId}`);
+        if (!res.ok) return null;
+        const job = await res.json();
+        if (job.status === 'done') return job.audio_path;
+        if (job.status === 'error') return null;
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
+function renderVideos(videos) {
+    const vc = document.getElementById('videoContainer');
+    vc.style.display = 'block';
+    vc.innerHTML = '<h3 style="margin-bottom:12px;">🎬 Video Tutorials</h3><div class="video-grid">' +
+        videos.map(v => {
+            if (v.is_search_link) {
+                return `<div class="video-card"><div class="video-title"><a href="${v.url}" target="_blank" style="color:var(--accent-blue);">🔗 ${v.title}</a></div></div>`;
+            }
+            return `<div class="video-card"><iframe src="https://www.youtube.com/embed/${v.video_id}" allowfullscreen></iframe><div class="video-title">${v.title}</div></div>`;
+        }).join('') + '</div>';
+}
+
 // ═══════════════════════════════════════════════════════
 //                  QUIZ
 // ═══════════════════════════════════════════════════════
@@ -546,6 +588,11 @@ async function sendChat() {
     // Show thinking indicator
     const thinkingId = addChatMessage('bot', '🧠 *Thinking...*');
 
+    if (state.chatMode === 'text') {
+        await streamChat(question, thinkingId);
+        return;
+    }
+
     try {
         const res = await fetch('/api/chat', {
             method: 'POST',
@@ -568,8 +615,11 @@ async function sendChat() {
         if (data.media) {
             if (data.media.type === 'image' && data.media.path) {
                 addChatMessage('bot', `![Diagram](${data.media.path})\n\n*${data.media.desc || ''}*`);
-            } else if (data.media.type === 'audio' && data.media.path) {
-                addChatMessage('bot', `🎧 Audio generated. <audio controls src="${data.media.path}" style="width:100%;margin-top:8px;"></audio>`);
+            } else if (data.media.type === 'audio' && data.media.job) {
+                const audioPath = await pollAudioJob(data.media.job);
+                if (audioPath) {
+                    addChatMessage('bot', `🎧 Audio generated. <audio controls src="${audioPath}" style="width:100%;margin-top:8px;"></audio>`);
+                }
             } else if (data.media.type === 'video' && data.media.videos) {
                 const vids = data.media.videos.slice(0, 2).map(v =>
                     v.video_id ? `🎥 [${v.title}](https://www.youtube.com/watch?v=${v.video_id})` : `🔗 [${v.title}](${v.url})`
@@ -589,6 +639,59 @@ async function sendChat() {
     }
 }
 
+async function streamChat(question, thinkingId) {
+    const history = state.chatMessages.slice(-7, -1);
+    let msgId = null;
+    let entry = null;
+    let text = '';
+    try {
+        await streamEvents('/api/chat', {
+            question,
+            level: state.level,
+            context_topic: state.currentTopicTitle,
+            chat_history: history,
+            mode: 'text',
+            stream: true
+        }, (event, data) => {
+            if (event === 'token') {
+                if (!msgId) {
+                    removeChatMessage(thinkingId);
+                    msgId = addChatMessage('bot', '');
+                    entry = state.chatMessages[state.chatMessages.length - 1];
+                }
+                text += data.text;
+                entry.content = text;
+                scheduleRender(() => updateChatMessage(msgId, text));
+            } else if (event === 'done') {
+                if (!msgId) {
+                    removeChatMessage(thinkingId);
+                    msgId = addChatMessage('bot', data.text);
+                    entry = state.chatMessages[state.chatMessages.length - 1];
+                }
+                entry.content = data.text;
+                updateChatMessage(msgId, data.text);
+                if (data.suggestions && data.suggestions.length) {
+                    const sugHtml = data.suggestions.map(s => `<button class="btn btn-sm btn-secondary" style="margin:2px;" onclick="document.getElementById('chatInput').value='${escapeHtml(s)}';sendChat();">${s.length > 35 ? s.slice(0, 35) + '…' : s}</button>`).join('');
+                    addChatMessageHtml('bot', `<div style="margin-top:8px;">${sugHtml}</div>`);
+                }
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
+    } catch (err) {
+        removeChatMessage(thinkingId);
+        addChatMessage('bot', '❌ Sorry, I encountered an error. Please try again.');
+    }
+}
+
+function updateChatMessage(id, text) {
+    const div = document.getElementById(id);
+    if (!div) return;
+    div.innerHTML = renderMarkdown(text);
+    const container = document.getElementById('chatMessages');
+    container.scrollTop = container.scrollHeight;
+}
+
 let chatMsgCounter = 0;
 function addChatMessage(role, text) {
     const id = `chat-msg-${chatMsgCounter++}`;
@@ -672,6 +775,55 @@ function renderMarkdown(text) {
         .replace(/\n/g, '<br>');
 }
 
+/**
+ * POST a JSON body and consume a Server-Sent Events response,
+ * calling onEvent(eventName, parsedData) for every event received.
+ */
+async function streamEvents(url, body, onEvent) {
+    const res = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify(body)
+    });
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Coalesce re-renders of streamed markdown to one per animation frame
+let pendingRender = null;
+function scheduleRender(fn) {
+    if (pendingRender) {
+        pendingRender = fn;
+        return;
+    }
+    pendingRender = fn;
+    requestAnimationFrame(() => {
+        const run = pendingRender;
+        pendingRender = null;
+        run();
+    });
+}
+
 function escapeHtml(text) {
     if (!text) return '';
     return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;').replace(/'/g, '&#039;');
@@ -763,3 +915,8 @@ document.addEventListener('DOMContentLoaded', () => {
     });
     observer.observe(document.querySelector('.main-content'), { childList: true, subtree: true });
 });
+
+// Leaving the page: stop speculative generation of upcoming topics
+window.addEventListener('pagehide', () => {
+    navigator.sendBeacon('/api/prefetch/cancel');
+});
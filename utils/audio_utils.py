@@ -2,11 +2,22 @@
 LearnSphere — Audio Utility Module
 Converts AI-generated scripts into natural-sounding MP3 audio via edge-tts.
 Uses Microsoft Edge's neural TTS voices for human-like speech.
+Synthesis runs on one persistent background event loop; callers either block
+on it (generate_audio) or enqueue a job and poll its status (submit_audio_job).
+Clips are stored by a hash of (script, voice, rate, pitch), so a repeated
+script is served from disk instead of being synthesized again; the same hash
+is the job id, so any worker process can report a job's status. Long scripts
+are split at sentence boundaries and the pieces synthesized concurrently.
 """
 
 import os
+import re
 import time
+import uuid
+import sqlite3
+import hashlib
 import asyncio
+import threading
 import edge_tts
 
 
@@ -14,6 +25,23 @@ AUDIO_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "generated_
 
 # Natural-sounding voice options
 VOICE = "en-US-AriaNeural"  # Friendly, clear female voice
+RATE = "-5%"                # Slightly slower for clarity
+PITCH = "+0Hz"
+
+# Concurrent edge-tts requests (script chunks) allowed on the background loop
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "8"))
+# Target size of one synthesized chunk of a long script
+CHUNK_CHARS = 500
+# Failed jobs are forgotten after this many seconds
+JOB_RETENTION = 60 * 60
+# A job still pending after this long is reported failed (its worker likely died)
+RENDER_TIMEOUT = 10 * 60
+
+AUDIO_INDEX_PATH = os.path.join(AUDIO_DIR, "clips.db")
+# Stored clips are evicted least-recently-used once the directory exceeds this
+AUDIO_DIR_MAX_BYTES = int(os.getenv("AUDIO_DIR_MAX_MB", "500")) * 1024 * 1024
+# Clips handed out this recently are never evicted (the browser may still be fetching them)
+EVICTION_GRACE = 10 * 60
 
 
 def ensure_audio_dir():
@@ -21,49 +49,350 @@ def ensure_audio_dir():
     os.makedirs(AUDIO_DIR, exist_ok=True)
 
 
-async def _generate_audio_async(text, filepath):
-    """Async helper for edge-tts generation."""
+def split_script(text, max_chars=CHUNK_CHARS):
+    """
+    Split a script into chunks of whole sentences (or "..." pauses),
+    each at most max_chars long unless a single sentence is longer.
+    """
+    sentences = [s for s in re.split(r"(?<=[.!?…])\s+", text.strip()) if s]
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _synthesize_chunk(text):
+    """Synthesize one chunk with edge-tts and return its MP3 bytes."""
     communicate = edge_tts.Communicate(
         text=text,
         voice=VOICE,
-        rate="-5%",      # Slightly slower for clarity
-        pitch="+0Hz",
+        rate=RATE,
+        pitch=PITCH,
     )
-    await communicate.save(filepath)
+    audio = bytearray()
+    async with _semaphore:
+        async for message in communicate.stream():
+            if message["type"] == "audio":
+                audio.extend(message["data"])
+    return bytes(audio)
 
 
-def generate_audio(text, topic="lesson"):
+# ─────────────── CLIP STORE ───────────────
+
+def clip_key(text, voice=VOICE, rate=RATE, pitch=PITCH):
+    """Content hash identifying one synthesized clip."""
+    payload = "\x1f".join((voice, rate, pitch, text))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class ClipIndex:
     """
-    Convert text to an MP3 file using edge-tts (natural neural voice).
-    Returns the absolute path to the generated file.
+    SQLite index of stored clips with hit counts and size-capped LRU
+    eviction, plus the renders in progress or failed. Shared by every worker
+    process on the host.
+    """
+
+    def __init__(self, path=AUDIO_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS audio_clips (
+                key TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                topic TEXT,
+                size INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS audio_renders (
+                key TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def path(self, key):
+        """Path of a stored clip, or None (without counting a hit)."""
+        with self._lock:
+            row = self._conn.execute("SELECT filename FROM audio_clips WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        filepath = os.path.join(AUDIO_DIR, row[0])
+        return filepath if os.path.exists(filepath) else None
+
+    def lookup(self, key):
+        """Path of a stored clip (counting a hit and refreshing its LRU position), or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT filename FROM audio_clips WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            filepath = os.path.join(AUDIO_DIR, row[0])
+            if not os.path.exists(filepath):
+                self._conn.execute("DELETE FROM audio_clips WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE audio_clips SET hits = hits + 1, last_used = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            return filepath
+
+    def add(self, key, filename, topic):
+        now = time.time()
+        size = os.path.getsize(os.path.join(AUDIO_DIR, filename))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO audio_clips (key, filename, topic, size, hits, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?)",
+                (key, filename, topic, size, now, now)
+            )
+            self._conn.commit()
+
+    def claim_render(self, key):
+        """Mark `key` as rendering; False while another render of it is pending."""
+        now = time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                "INSERT INTO audio_renders (key, status, error, updated_at) VALUES (?, 'pending', NULL, ?) "
+                "ON CONFLICT(key) DO UPDATE SET status = 'pending', error = NULL, updated_at = excluded.updated_at "
+                "WHERE audio_renders.status = 'error' OR audio_renders.updated_at < ?",
+                (key, now, now - RENDER_TIMEOUT)
+            ).rowcount > 0
+            self._conn.commit()
+        return claimed
+
+    def finish_render(self, key, error=None):
+        """Record a render's outcome: forgotten on success (the clip is indexed), kept on error."""
+        with self._lock:
+            if error is None:
+                self._conn.execute("DELETE FROM audio_renders WHERE key = ?", (key,))
+            else:
+                self._conn.execute(
+                    "UPDATE audio_renders SET status = 'error', error = ?, updated_at = ? WHERE key = ?",
+                    (error, time.time(), key)
+                )
+            self._conn.commit()
+
+    def render(self, key):
+        """(status, error, updated_at) of a pending or failed render, or None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT status, error, updated_at FROM audio_renders WHERE key = ?", (key,)
+            ).fetchone()
+
+    def prune_renders(self, max_age=JOB_RETENTION):
+        with self._lock:
+            self._conn.execute("DELETE FROM audio_renders WHERE updated_at < ?", (time.time() - max_age,))
+            self._conn.commit()
+
+    def adopt_untracked(self):
+        """
+        Index MP3s in AUDIO_DIR the index doesn't know about (e.g. written
+        before it existed), so they count toward the size cap and take part in
+        LRU eviction, and delete partial files left by renders that died.
+        """
+        now = time.time()
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT filename FROM audio_clips")}
+            for entry in os.scandir(AUDIO_DIR):
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith(".part") and now - stat.st_mtime > RENDER_TIMEOUT:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                elif entry.name.endswith(".mp3") and entry.name not in known:
+                    # A clip's key is its file stem, so a concurrent add() of it wins the row
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO audio_clips (key, filename, topic, size, hits, created_at, last_used) "
+                        "VALUES (?, ?, NULL, ?, 0, ?, ?)",
+                        (entry.name[:-len(".mp3")], entry.name, stat.st_size, stat.st_mtime, stat.st_mtime)
+                    )
+            self._conn.commit()
+
+    def evict(self, max_bytes=AUDIO_DIR_MAX_BYTES):
+        """Delete least-recently-used clips until the store fits in max_bytes."""
+        removed = []
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM audio_clips").fetchone()[0]
+            if total <= max_bytes:
+                return removed
+            rows = self._conn.execute(
+                "SELECT key, filename, size FROM audio_clips WHERE last_used < ? ORDER BY last_used, hits",
+                (time.time() - EVICTION_GRACE,)
+            ).fetchall()
+            for key, filename, size in rows:
+                if total <= max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(AUDIO_DIR, filename))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM audio_clips WHERE key = ?", (key,))
+                total -= size
+                removed.append(filename)
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            count, size, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM audio_clips"
+            ).fetchone()
+        return {"clips": count, "bytes": size, "hits": hits}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _get_index():
+    """Singleton clip index; on first use it takes stock of the directory and trims it to size."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                ensure_audio_dir()
+                index = ClipIndex()
+                index.adopt_untracked()
+                index.evict()
+                _index = index
+    return _index
+
+
+# ─────────────── BACKGROUND EVENT LOOP ───────────────
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphore = None
+
+
+def _get_loop():
+    """Start (once) and return the event loop that runs every synthesis."""
+    global _loop, _semaphore
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="audio-loop", daemon=True).start()
+                _semaphore = asyncio.run_coroutine_threadsafe(_make_semaphore(), loop).result()
+                _loop = loop
+    return _loop
+
+
+async def _make_semaphore():
+    return asyncio.Semaphore(AUDIO_WORKERS)
+
+
+# Clip key -> task rendering it; only touched from the loop thread
+_inflight = {}
+
+
+async def _synthesize(text, topic):
+    """
+    Return the stored clip for `text`, synthesizing it if needed.
+    Concurrent requests for the same clip share one synthesis.
+    """
+    key = clip_key(text)
+    filepath = _get_index().lookup(key)
+    if filepath:
+        return filepath
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render_clip(key, text, topic))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    filepath = await asyncio.shield(task)
+    _get_index().lookup(key)  # count this follower's hit
+    return filepath
+
+
+async def _render_clip(key, text, topic):
+    """
+    Synthesize one clip into the store. Chunks run concurrently (bounded by the
+    worker semaphore) and their MP3 frames are concatenated in script order.
     """
     ensure_audio_dir()
-    safe_name = "".join(c if c.isalnum() or c in "-_ " else "" for c in topic).strip().replace(" ", "_")
-    timestamp = int(time.time())
-    filename = f"{safe_name}_{timestamp}.mp3"
+    filename = f"{key}.mp3"
     filepath = os.path.join(AUDIO_DIR, filename)
-
-    # Run the async edge-tts generation
+    # Unique per writer: another worker process may be rendering the same clip
+    partial = f"{filepath}.{os.getpid()}.{uuid.uuid4().hex}.part"
+    segments = await asyncio.gather(*(_synthesize_chunk(chunk) for chunk in split_script(text)))
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # If we're already in an async context, create a new loop
-            import threading
-            result = [None]
-            def run():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                new_loop.run_until_complete(_generate_audio_async(text, filepath))
-                new_loop.close()
-            thread = threading.Thread(target=run)
-            thread.start()
-            thread.join()
-        else:
-            loop.run_until_complete(_generate_audio_async(text, filepath))
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(_generate_audio_async(text, filepath))
-        loop.close()
+        with open(partial, "wb") as f:
+            for segment in segments:
+                f.write(segment)
+        os.replace(partial, filepath)
+    except OSError:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
 
+    index = _get_index()
+    index.add(key, filename, topic)
+    index.evict()
     return filepath
+
+
+def generate_audio(text, topic="lesson"):
+    """
+    Convert text to an MP3 file using edge-tts (natural neural voice).
+    Blocks until done. Returns the absolute path to the (possibly reused) file.
+    """
+    future = asyncio.run_coroutine_threadsafe(_synthesize(text, topic), _get_loop())
+    return future.result()
+
+
+# ─────────────── JOB QUEUE ───────────────
+
+def submit_audio_job(text, topic="lesson"):
+    """
+    Queue a synthesis and return its job id (the clip key) immediately.
+    Poll get_audio_job(job_id) for the outcome, from any worker process.
+    """
+    key = clip_key(text)
+    index = _get_index()
+    index.prune_renders()
+    if index.lookup(key) is None and index.claim_render(key):
+        future = asyncio.run_coroutine_threadsafe(_synthesize(text, topic), _get_loop())
+        future.add_done_callback(lambda f: _finish_job(key, f))
+    return key
+
+
+def _finish_job(key, future):
+    error = future.exception()
+    _get_index().finish_render(key, None if error is None else str(error) or type(error).__name__)
+
+
+def get_audio_job(job_id):
+    """Status of a queued synthesis: dict with status/path/error, or None if unknown."""
+    index = _get_index()
+    filepath = index.path(job_id)
+    if filepath:
+        return {"status": "done", "path": filepath, "error": None}
+    render = index.render(job_id)
+    if render is None:
+        return None
+    status, error, updated_at = render
+    if status == "pending" and time.time() - updated_at > RENDER_TIMEOUT:
+        status, error = "error", "Audio synthesis did not finish"
+    return {"status": status, "path": None, "error": error}
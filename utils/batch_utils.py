@@ -0,0 +1,114 @@
+"""
+LearnSphere — Batch Utility Module
+Runs many (generator, topic, level) jobs at once for preparing a whole
+roadmap: duplicates are generated once, at most BATCH_WORKERS completions
+are in flight against the LLM, and results are yielded as they finish.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+
+from utils.genai_utils import (
+    generate_reading_content, generate_audio_script, generate_code_content,
+    generate_visual_content, generate_quiz, generate_flashcards, generate_concept_flow
+)
+
+
+# Completions in flight for all batches combined
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "12"))
+BATCH_MAX_JOBS = 60
+# Whole-batch deadline (seconds); unfinished jobs are reported as timed out
+BATCH_TIMEOUT = int(os.getenv("BATCH_TIMEOUT", "300"))
+
+BATCH_GENERATORS = {
+    "reading": generate_reading_content,
+    "audio_script": generate_audio_script,
+    "code": generate_code_content,
+    "visual": generate_visual_content,
+    "quiz": generate_quiz,
+    "flashcards": generate_flashcards,
+    "concept_flow": generate_concept_flow,
+}
+
+# Separate from the fan-out pool so a large batch can't starve interactive requests
+_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+
+def plan_batch(jobs):
+    """
+    Validate raw job dicts and group duplicates.
+    Returns {(generator, topic, level): [job indexes]} in first-seen order.
+    Raises ValueError for an empty, oversized or malformed batch.
+    """
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError("jobs must be a non-empty list")
+    if len(jobs) > BATCH_MAX_JOBS:
+        raise ValueError(f"At most {BATCH_MAX_JOBS} jobs per batch")
+
+    plan = {}
+    for i, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValueError(f"Job {i} must be an object")
+        generator = job.get("generator")
+        topic = (job.get("topic") or "").strip()
+        if generator not in BATCH_GENERATORS:
+            raise ValueError(f"Job {i}: unknown generator '{generator}' (expected one of {sorted(BATCH_GENERATORS)})")
+        if not topic:
+            raise ValueError(f"Job {i}: topic is required")
+        plan.setdefault((generator, topic, job.get("level") or "Beginner"), []).append(i)
+    return plan
+
+
+def _timed(fn, topic, level, queued_at):
+    started = time.monotonic()
+    result = fn(topic, level)
+    return result, started - queued_at, time.monotonic() - started
+
+
+def run_batch(plan, timeout=BATCH_TIMEOUT):
+    """
+    Run a plan from plan_batch and yield one result dict per unique job as it
+    completes: ids, generator, topic, level, ok, result/error, queued_ms, run_ms.
+    """
+    queued_at = time.monotonic()
+    futures = {}
+    for key, ids in plan.items():
+        generator, topic, level = key
+        future = _executor.submit(_timed, BATCH_GENERATORS[generator], topic, level, queued_at)
+        futures[future] = key
+
+    reported = set()
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            reported.add(future)
+            yield _job_result(plan, futures[future], future)
+    except FutureTimeout:
+        # Every job gets exactly one line: ones that finished just as time ran out keep their result
+        for future, key in futures.items():
+            if future in reported:
+                continue
+            if future.done():
+                yield _job_result(plan, key, future)
+            else:
+                future.cancel()
+                yield _job_line(plan, key, ok=False, error=f"Timed out after {timeout}s")
+
+
+def _job_result(plan, key, future):
+    try:
+        result, queued, run = future.result()
+    except Exception as e:
+        return _job_line(plan, key, ok=False, error=str(e))
+    return _job_line(plan, key, ok=True, result=result,
+                     queued_ms=round(queued * 1000), run_ms=round(run * 1000))
+
+
+def _job_line(plan, key, ok, result=None, error=None, queued_ms=None, run_ms=None):
+    generator, topic, level = key
+    line = {"ids": plan[key], "generator": generator, "topic": topic, "level": level, "ok": ok}
+    if ok:
+        line.update(result=result, queued_ms=queued_ms, run_ms=run_ms)
+    else:
+        line["error"] = error
+    return line
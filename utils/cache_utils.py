@@ -0,0 +1,429 @@
+"""
+LearnSphere — Response Cache Module
+Two-tier cache for LLM completions: a small in-process LRU in front of a
+persistent SQLite store, keyed on (model, normalized prompt hash). The SQLite
+file is shared by every worker process on the host, so one worker's
+generation serves them all.
+"""
+
+import os
+import json
+import re
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+CACHE_DB_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "llm_cache.db")
+)
+MEMORY_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "5000"))
+# Size bound for the shared file (stored, i.e. compressed, bytes)
+DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MB", "256")) * 1024 * 1024
+# Values at least this long are zlib-compressed (generated markdown shrinks ~3x)
+COMPRESS_MIN_BYTES = 1024
+# A worker filling a key holds a lease this long; others wait for its result meanwhile
+FILL_LEASE = float(os.getenv("LLM_CACHE_FILL_LEASE", "60"))
+# Hits refresh last_access at most this often, so reads rarely take the write lock
+ACCESS_RESOLUTION = 60
+
+DAY = 24 * 60 * 60
+# Expired completions are kept this much longer, to serve while the LLM is down
+STALE_GRACE = 7 * DAY
+
+# Freshness window (seconds) per generator. Generators not listed here are
+# never cached — chat answers, feedback and revision depend on the learner.
+CACHE_TTLS = {
+    "roadmap": 7 * DAY,
+    "reading": 7 * DAY,
+    "code": 7 * DAY,
+    "visual": 7 * DAY,
+    "audio_script": 7 * DAY,
+    "concept_flow": 7 * DAY,
+    "flashcards": 1 * DAY,
+    # Short: absorbs a class opening the same quiz at once, retakes later get new questions
+    "quiz": 10 * 60,
+}
+
+
+def make_key(model, prompt, response_format=None):
+    """
+    Cache key for a completion: model plus a hash of the whitespace-normalized
+    prompt and the response format, if any (structured and free-text replies differ).
+    """
+    normalized = re.sub(r"\s+", " ", prompt).strip()
+    if response_format:
+        normalized += "\x1f" + json.dumps(response_format, sort_keys=True)
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class MemoryTier:
+    """Thread-safe, size-bounded LRU of (value, expires_at) pairs."""
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stale_ok=False):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            now = time.time()
+            if expires_at + STALE_GRACE < now:
+                del self._data[key]
+                return None
+            if expires_at < now and not stale_ok:
+                return None
+            self._data.move_to_end(key)
+            return value, expires_at
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _encode(value):
+    """(stored bytes or text, codec) for a value."""
+    data = value.encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return packed, "zlib"
+    return value, None
+
+
+def _decode(stored, codec):
+    return zlib.decompress(stored).decode("utf-8") if codec == "zlib" else stored
+
+
+class SQLiteTier:
+    """
+    Persistent tier in a standalone SQLite file, shared across processes.
+    Large values are compressed; the file is bounded by entries and by bytes,
+    evicting least-recently-used first. `add` is an atomic set-if-absent and
+    `claim`/`wait` let one process fill a missing key while others wait for it.
+    """
+
+    EVICT_EVERY = 50  # writes between eviction sweeps
+    MMAP_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=DISK_MAX_ENTRIES, max_bytes=DISK_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.waits = {"filled": 0, "gave_up": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={self.MMAP_BYTES}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                codec TEXT,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_fill_leases (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key, stale_ok=False):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, codec, expires_at, last_access FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored, codec, expires_at, last_access = row
+            if expires_at + STALE_GRACE < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            if expires_at < now and not stale_ok:
+                return None
+            if last_access < now - ACCESS_RESOLUTION:
+                self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        return _decode(stored, codec), expires_at
+
+    def set(self, key, value, expires_at):
+        self._write("INSERT OR REPLACE", key, value, expires_at)
+
+    def add(self, key, value, expires_at):
+        """
+        Store `value` unless a live entry exists. Returns (value, expires_at) as
+        cached afterwards — the earlier writer's if there was one.
+        """
+        if self._write("INSERT", key, value, expires_at, if_absent=True):
+            return value, expires_at
+        return self.get(key) or (value, expires_at)
+
+    def _write(self, verb, key, value, expires_at, if_absent=False):
+        stored, codec = _encode(value)
+        size = len(stored) if codec else len(value.encode("utf-8"))
+        sql = (f"{verb} INTO llm_cache (key, value, codec, size, expires_at, last_access) "
+               "VALUES (?, ?, ?, ?, ?, ?)")
+        params = [key, stored, codec, size, expires_at, time.time()]
+        if if_absent:
+            # An expired row doesn't count as present
+            sql += (" ON CONFLICT(key) DO UPDATE SET value = excluded.value, codec = excluded.codec, "
+                    "size = excluded.size, expires_at = excluded.expires_at, last_access = excluded.last_access "
+                    "WHERE llm_cache.expires_at < ?")
+            params.append(time.time())
+        with self._lock:
+            written = self._conn.execute(sql, params).rowcount > 0
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+        return written
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def claim(self, key, lease=FILL_LEASE):
+        """Take the fill lease for `key`; False while another process holds a live one."""
+        now = time.time()
+        with self._lock:
+            granted = self._conn.execute(
+                "INSERT INTO llm_fill_leases (key, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE llm_fill_leases.expires_at < ?",
+                (key, now + lease, now)
+            ).rowcount > 0
+            self._conn.commit()
+        return granted
+
+    def release(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_fill_leases WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def wait(self, key, timeout=FILL_LEASE):
+        """
+        Poll for the value another process is filling. Returns it, or None if
+        the lease ends (filler failed or gave up) or `timeout` passes first.
+        """
+        deadline = time.time() + timeout
+        delay = 0.05
+        while time.time() < deadline:
+            entry = self.get(key)
+            if entry is not None:
+                with self._lock:
+                    self.waits["filled"] += 1
+                return entry[0]
+            with self._lock:
+                leased = self._conn.execute(
+                    "SELECT 1 FROM llm_fill_leases WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+            if not leased:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        with self._lock:
+            self.waits["gave_up"] += 1
+        return None
+
+    def _evict(self):
+        """
+        Drop rows past their stale grace and stale leases, then the least
+        recently used rows beyond max_entries or max_bytes.
+        """
+        now = time.time()
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now - STALE_GRACE,))
+        self._conn.execute("DELETE FROM llm_fill_leases WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM "
+            "(SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running FROM llm_cache) "
+            "WHERE running > ?)",
+            (self.max_bytes,)
+        )
+
+    def stats(self):
+        with self._lock:
+            entries, stored, compressed = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(codec IS NOT NULL), 0) FROM llm_cache"
+            ).fetchone()
+        return {"entries": entries, "bytes": stored, "compressed": compressed,
+                "max_bytes": self.max_bytes, "waits": dict(self.waits)}
+
+
+class ResponseCache:
+    """
+    Looks a key up in each tier in order, back-filling faster tiers on a hit.
+    Any tier object with get(key, stale_ok)/set/delete can be plugged in.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self.hits = {type(t).__name__: 0 for t in tiers}
+        self.misses = 0
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get(key)
+            except sqlite3.Error:
+                continue
+            if entry is None:
+                continue
+            value, expires_at = entry
+            for faster in self.tiers[:i]:
+                faster.set(key, value, expires_at)
+            with self._lock:
+                self.hits[type(tier).__name__] += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_stale(self, key):
+        """
+        Value for `key` even if expired (within STALE_GRACE), for serving
+        degraded content while the LLM is unavailable. Not counted in stats.
+        """
+        for tier in self.tiers:
+            try:
+                entry = tier.get(key, stale_ok=True)
+            except sqlite3.Error:
+                continue
+            if entry is not None:
+                return entry[0]
+        return None
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        for tier in self.tiers:
+            try:
+                tier.set(key, value, expires_at)
+            except sqlite3.Error:
+                pass
+
+    def add(self, key, value, ttl):
+        """
+        Set-if-absent on the shared tier, then the faster tiers. Returns the
+        value now cached, so every worker serves the same completion.
+        """
+        expires_at = time.time() + ttl
+        for i, tier in reversed(list(enumerate(self.tiers))):
+            if hasattr(tier, "add"):
+                try:
+                    value, expires_at = tier.add(key, value, expires_at)
+                except sqlite3.Error:
+                    continue
+                for faster in self.tiers[:i]:
+                    faster.set(key, value, expires_at)
+                return value
+        self.set(key, value, ttl)
+        return value
+
+    def delete(self, key):
+        for tier in self.tiers:
+            try:
+                tier.delete(key)
+            except sqlite3.Error:
+                pass
+
+    @contextmanager
+    def filling(self, key):
+        """
+        Cross-process stampede guard around generating a missing value. Yields
+        None when this process should generate it (holding the fill lease), or
+        the value another process produced while we waited.
+        """
+        shared = next((t for t in self.tiers if hasattr(t, "claim")), None)
+        try:
+            claimed = shared is None or shared.claim(key)
+        except sqlite3.Error:
+            claimed, shared = True, None
+        if not claimed:
+            try:
+                value = shared.wait(key)
+            except sqlite3.Error:
+                value = None
+            if value is not None:
+                yield value
+                return
+        try:
+            yield None
+        finally:
+            if claimed and shared is not None:
+                try:
+                    shared.release(key)
+                except sqlite3.Error:
+                    pass
+
+    def stats(self):
+        """Hit/miss counters since process start, plus the shared tier's size."""
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            stats = {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+        for tier in self.tiers:
+            if hasattr(tier, "stats"):
+                try:
+                    stats[type(tier).__name__] = tier.stats()
+                except sqlite3.Error:
+                    pass
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Singleton response cache (memory LRU + SQLite; memory only if the file can't be opened)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                tiers = [MemoryTier()]
+                try:
+                    tiers.append(SQLiteTier())
+                except sqlite3.Error:
+                    pass
+                _cache = ResponseCache(tiers)
+    return _cache
@@ -0,0 +1,121 @@
+"""
+LearnSphere — Concurrency Utility Module
+Runs independent upstream calls (LLM, TTS, image, YouTube) side by side
+so a request waits for the slowest branch instead of the sum of them.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.resilience_utils import LLMUnavailableError
+
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "16"))
+
+# Per-branch deadlines (seconds)
+LLM_TIMEOUT = 90
+VIDEO_TIMEOUT = 15
+IMAGE_TIMEOUT = 90
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def submit(fn, *args, **kwargs):
+    """Start fn(*args, **kwargs) on the shared pool and return its Future."""
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def _fallback_value(fallback, error):
+    return fallback(error) if callable(fallback) else fallback
+
+
+def join(future, timeout, fallback=None):
+    """
+    Wait up to `timeout` seconds for a Future.
+    On timeout or error returns `fallback` (called with the exception if callable).
+    A timed-out branch keeps running in the background; its result is discarded.
+    """
+    try:
+        return future.result(timeout=max(timeout, 0))
+    except FutureTimeout as e:
+        future.cancel()
+        return _fallback_value(fallback, e)
+    except Exception as e:
+        return _fallback_value(fallback, e)
+
+
+def fan_out(branches):
+    """
+    Run several branches concurrently and join them all.
+    `branches` maps a name to (callable, timeout_seconds, fallback).
+    Returns a dict of name -> result (or that branch's fallback).
+    """
+    started = time.monotonic()
+    futures = {name: (submit(fn), timeout, fallback) for name, (fn, timeout, fallback) in branches.items()}
+    results = {}
+    for name, (future, timeout, fallback) in futures.items():
+        remaining = started + timeout - time.monotonic()
+        results[name] = join(future, remaining, fallback)
+    return results
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution: the first
+    caller (leader) runs it, later callers (followers) wait for the leader's
+    result or exception. Nothing is remembered once the call completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Return fn() for `key`, sharing one in-flight execution.
+        Followers raise LLMUnavailableError if the leader takes longer than
+        `timeout`, so callers degrade (stale cache, 503) as for any LLM outage.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise LLMUnavailableError(f"Timed out after {timeout}s waiting for an identical in-flight call")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._calls),
+            }
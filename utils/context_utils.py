@@ -0,0 +1,139 @@
+"""
+LearnSphere — Chat Context Module
+Fits chat history into a fixed token budget: recent turns are kept (long
+ones trimmed), older turns are folded into a rolling summary that is built
+in the background and cached per conversation, so prompt size — and chat
+latency — stay flat as a conversation grows.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from utils.concurrency_utils import submit
+from utils.routing_utils import estimate_tokens
+
+
+# Tokens allowed for the whole "Previous conversation" section
+CHAT_HISTORY_BUDGET = int(os.getenv("CHAT_HISTORY_BUDGET", "800"))
+# A single turn is trimmed to this many tokens
+TURN_MAX_TOKENS = 250
+# At most this many recent turns are kept verbatim
+RECENT_TURNS = 6
+SUMMARY_MAX_TOKENS = 150
+# Rolling summaries kept in memory (one per conversation prefix)
+SUMMARY_CACHE_ENTRIES = 512
+
+
+def _trim(text, max_tokens):
+    """Cut text to roughly max_tokens, keeping the start."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+def _normalize(chat_history):
+    turns = []
+    for turn in chat_history or []:
+        content = (turn.get("content") or "").strip()
+        if content:
+            role = "Student" if turn.get("role") == "user" else "GyanGuru"
+            turns.append((role, content))
+    return turns
+
+
+def _chain_hashes(turns):
+    """Hash of every prefix of `turns`, so a conversation's summaries can be found as it grows."""
+    digest = hashlib.sha256()
+    hashes = []
+    for role, content in turns:
+        digest.update(f"{role}\x1f{content}\x1e".encode("utf-8"))
+        hashes.append(digest.copy().hexdigest()[:32])
+    return hashes
+
+
+class ChatContextBuilder:
+    """
+    Builds the history section of a chat prompt within a token budget.
+    `summarize(previous_summary, transcript)` must return a short summary; it
+    runs off the request path and its results are cached per history prefix.
+    """
+
+    def __init__(self, summarize, budget=CHAT_HISTORY_BUDGET):
+        self.summarize = summarize
+        self.budget = budget
+        self._summaries = OrderedDict()  # prefix hash -> summary of that prefix
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def build(self, chat_history):
+        """Return (history text, token estimate)."""
+        turns = _normalize(chat_history)
+        recent, used = [], 0
+        for role, content in reversed(turns[-RECENT_TURNS:]):
+            line = f"{role}: {_trim(content, TURN_MAX_TOKENS)}"
+            cost = estimate_tokens(line)
+            if recent and used + cost > self.budget - SUMMARY_MAX_TOKENS:
+                break
+            recent.append(line)
+            used += cost
+        recent.reverse()
+
+        older = turns[:len(turns) - len(recent)]
+        sections = []
+        if older:
+            summary = self._summary_for(older)
+            if summary:
+                sections.append(f"Summary of the earlier conversation: {_trim(summary, SUMMARY_MAX_TOKENS)}")
+        sections.extend(recent)
+        text = "\n".join(sections)
+        return text, estimate_tokens(text) if text else 0
+
+    def _summary_for(self, older):
+        """
+        Best summary available now for `older` turns. An exact cached summary is
+        used as is; otherwise the longest cached prefix summary plus the later
+        questions is returned and a full summary is scheduled in the background.
+        """
+        hashes = _chain_hashes(older)
+        with self._lock:
+            for covered in range(len(older), 0, -1):
+                summary = self._summaries.get(hashes[covered - 1])
+                if summary is not None:
+                    self._summaries.move_to_end(hashes[covered - 1])
+                    break
+            else:
+                covered, summary = 0, ""
+
+        if covered == len(older):
+            return summary
+
+        rest = older[covered:]
+        self._schedule(hashes[-1], summary, rest)
+        asked = "; ".join(_trim(content, 30) for role, content in rest if role == "Student")
+        stopgap = f"{summary} Earlier the student also asked: {asked}" if asked else summary
+        return stopgap.strip()
+
+    def _schedule(self, key, previous, turns):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        transcript = "\n".join(f"{role}: {_trim(content, TURN_MAX_TOKENS)}" for role, content in turns)
+        submit(self._run_summary, key, previous, transcript)
+
+    def _run_summary(self, key, previous, transcript):
+        try:
+            summary = (self.summarize(previous, transcript) or "").strip()
+            if summary:
+                with self._lock:
+                    self._summaries[key] = summary
+                    while len(self._summaries) > SUMMARY_CACHE_ENTRIES:
+                        self._summaries.popitem(last=False)
+        except Exception:
+            pass  # the next request falls back to the stopgap again
+        finally:
+            with self._lock:
+                self._pending.discard(key)
@@ -6,40 +6,286 @@ Roadmap, explanations, code, quizzes, feedback, revision, projects.
 
 import os
 import json
-import re
 from dotenv import load_dotenv
-from cerebras.cloud.sdk import Cerebras
+from cerebras.cloud.sdk import Cerebras, BadRequestError
+
+from utils.cache_utils import get_cache, make_key, CACHE_TTLS, FILL_LEASE
+from utils.concurrency_utils import SingleFlight
+from utils.resilience_utils import (
+    ResilientCaller, FakeBackend, LLMUnavailableError, deadline_for, DEADLINES, DEFAULT_DEADLINE
+)
+from utils.routing_utils import ModelRouter, estimate_tokens
+from utils.context_utils import ChatContextBuilder
+from utils.json_utils import extract_json, validate
+from utils.level_utils import classify_level, LEVEL_CONFIDENCE
+from utils.grading_utils import is_locally_gradable, grade_choice, choice_feedback, build_feedback
 
 load_dotenv()
 
+# Use the API's json_schema response format for JSON generators (falls back to prompting)
+STRUCTURED_OUTPUTS = os.getenv("LLM_STRUCTURED_OUTPUTS", "1") == "1"
+# Extra seconds a single-flight follower waits beyond the leader's worst case
+FLIGHT_GRACE = 5
+
 _client = None
+# Identical (model, prompt) completions in flight, e.g. a class opening the same lesson
+_flights = SingleFlight()
+# Deadlines, retries, hedging and circuit breaker for every completion
+_caller = ResilientCaller()
+# Which model (tier) serves each task, with per-tier concurrency and accounting
+_router = ModelRouter()
 
 
 def get_client():
-    """Singleton Cerebras client."""
+    """Singleton Cerebras client (or the offline fake when LLM_BACKEND=fake)."""
     global _client
     if _client is None:
+        if os.getenv("LLM_BACKEND") == "fake":
+            _client = FakeBackend()
+            return _client
         api_key = os.getenv("CEREBRAS_API_KEY")
         if not api_key or api_key == "your_cerebras_api_key_here":
             raise ValueError("Please set your CEREBRAS_API_KEY in the .env file")
-        _client = Cerebras(api_key=api_key)
+        # Retries are done by _caller, within each generator's deadline
+        _client = Cerebras(api_key=api_key, max_retries=0)
     return _client
 
 
-def _ask_llm(prompt, model="llama3.1-8b"):
-    """Send a prompt to Cerebras and return text."""
+def _ask_llm(prompt, model=None, task=None, response_format=None):
+    """
+    Send a prompt to Cerebras and return text.
+    The model comes from the task's routing tier unless `model` is given.
+    Completions for deterministic generators (`task` listed in CACHE_TTLS)
+    are served from the response cache when possible, and identical calls
+    already in flight share one completion — within this process and, through
+    the shared cache tier, across worker processes. While the LLM is
+    unavailable a stale cached completion is served if there is one; otherwise
+    LLMUnavailableError propagates.
+    """
+    model = model or _router.model_for(task)
+    ttl = CACHE_TTLS.get(task)
+    key = make_key(model, prompt, response_format)
+    if ttl:
+        cached = get_cache().get(key)
+        if cached is not None:
+            return cached
+
+    def fill():
+        if ttl:
+            return _fill_cached(key, ttl, prompt, model, response_format, task)
+        return _complete(prompt, model, response_format, task)[0]
+
+    # Followers outlast the leader: a fill-lease wait on another process, then its own deadline
+    timeout = (FILL_LEASE if ttl else 0) + DEADLINES.get(task, DEFAULT_DEADLINE) + FLIGHT_GRACE
+    try:
+        return _flights.do(key, fill, timeout=timeout)
+    except LLMUnavailableError:
+        stale = get_cache().get_stale(key) if ttl else None
+        if stale is None:
+            raise
+        return stale
+
+
+def _fill_cached(key, ttl, prompt, model, response_format, task):
+    """
+    Generate and cache a missing completion. Only one worker process at a time
+    calls the LLM for a key; the others take its result from the shared tier.
+    """
+    cache = get_cache()
+    with cache.filling(key) as filled:
+        if filled is not None:
+            return filled
+        text, served_by = _complete(prompt, model, response_format, task)
+        # A reply downgraded to a smaller model under load is not cached as the larger model's
+        if text and served_by == model:
+            return cache.add(key, text, ttl)
+        return text
+
+
+def _complete(prompt, model, response_format=None, task=None):
+    """One non-streaming completion within the task's deadline (slot wait included). Returns (text, model used)."""
     client = get_client()
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-    )
-    return response.choices[0].message.content
+    extra = {"response_format": response_format} if response_format else {}
+    deadline = deadline_for(task)
+    with _router.slot(task, model, deadline=deadline) as slot:
+        response = _caller.call(lambda timeout: client.chat.completions.create(
+            model=slot.model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            timeout=timeout,
+            **extra,
+        ), task=task, deadline=deadline)
+        text = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            slot.usage(usage.prompt_tokens, usage.completion_tokens)
+        else:
+            slot.usage(estimate_tokens(prompt), estimate_tokens(text))
+    return text, slot.model
+
+
+def llm_stats():
+    """Counters for the metrics endpoint."""
+    return {
+        "single_flight": _flights.stats(),
+        "cache": get_cache().stats(),
+        "upstream": _caller.stats(),
+        "routing": _router.stats(),
+    }
+
+
+def _forget_llm(prompt, model=None, task=None, response_format=None):
+    """Drop a cached completion, e.g. one that turned out to be unparseable."""
+    get_cache().delete(make_key(model or _router.model_for(task), prompt, response_format))
+
+
+def _stream_llm(prompt, model=None, task=None):
+    """
+    Streaming counterpart of _ask_llm: yields text deltas as Cerebras produces them.
+    A cache hit is yielded as a single chunk; a completed stream is cached like _ask_llm.
+    Opening the stream is retried like a completion (never hedged). The tier slot
+    is held until the stream is consumed or closed.
+    """
+    model = model or _router.model_for(task)
+    ttl = CACHE_TTLS.get(task)
+    key = make_key(model, prompt)
+    if ttl:
+        cached = get_cache().get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    client = get_client()
+    deadline = deadline_for(task)
+    parts = []
+    try:
+        with _router.slot(task, model, deadline=deadline) as slot:
+            stream = _caller.call(lambda timeout: client.chat.completions.create(
+                model=slot.model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True,
+                timeout=timeout,
+            ), task=task, hedge=False, deadline=deadline)
+
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+            text = "".join(parts)
+            slot.usage(estimate_tokens(prompt), estimate_tokens(text))
+    except LLMUnavailableError:
+        # No slot or no stream before the deadline: fall back before anything was sent
+        stale = get_cache().get_stale(key) if ttl and not parts else None
+        if stale is None:
+            raise
+        yield stale
+        return
+    if ttl and text and slot.model == model:
+        get_cache().add(key, text, ttl)
+
+
+# Models that rejected the json_schema response format; they get the prompt path only
+_no_structured = set()
+
+
+def _ask_llm_json(prompt, schema, model=None, task=None, retries=1, structured_prompt=None):
+    """
+    Ask for JSON and return the first value in the reply that matches `schema`.
+    With `structured_prompt` (a short prompt without format instructions) the API's
+    json_schema response format is tried first. Otherwise, or if that fails, `prompt`
+    is used and an unusable reply is dropped from the cache and the model asked to
+    repair it, up to `retries` times. Raises ValueError when every attempt fails.
+    """
+    model = model or _router.model_for(task)
+    if structured_prompt and STRUCTURED_OUTPUTS and model not in _no_structured:
+        try:
+            return _ask_llm_structured(structured_prompt, schema, model=model, task=task)
+        except BadRequestError:
+            _no_structured.add(model)
+        except ValueError:
+            pass
+
+    raw = _ask_llm(prompt, model=model, task=task)
+    for attempt in range(retries + 1):
+        try:
+            return validate(extract_json(raw), schema)
+        except ValueError as e:
+            if attempt == 0:
+                _forget_llm(prompt, model)
+            if attempt == retries:
+                raise
+            raw = _ask_llm(_repair_prompt(raw, str(e), schema), model=model)
+
+
+def _ask_llm_structured(prompt, schema, model=None, task=None):
+    """
+    One completion constrained to `schema` via response_format. The root of a
+    json_schema must be an object, so arrays travel wrapped as {"items": [...]}.
+    """
+    wrapped = schema["type"] != "object"
+    root = {"type": "object", "required": ["items"], "properties": {"items": schema}} if wrapped else schema
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": task or "response", "strict": True, "schema": _strict_schema(root)},
+    }
+    model = model or _router.model_for(task)
+    raw = _ask_llm(prompt, model=model, task=task, response_format=response_format)
+    try:
+        value = json.loads(raw)
+        return validate(value["items"] if wrapped else value, schema)
+    except (ValueError, KeyError, TypeError) as e:
+        _forget_llm(prompt, model, response_format=response_format)
+        raise ValueError(f"Structured output did not match schema: {e}")
+
+
+def _strict_schema(schema):
+    """Copy of a schema in strict-mode form: closed objects, no minItems."""
+    strict = {k: v for k, v in schema.items() if k != "minItems"}
+    if "properties" in strict:
+        strict["properties"] = {k: _strict_schema(v) for k, v in strict["properties"].items()}
+        strict["additionalProperties"] = False
+    if "items" in strict:
+        strict["items"] = _strict_schema(strict["items"])
+    return strict
+
+
+def _repair_prompt(raw, error, schema):
+    return f"""The text below was supposed to be valid JSON matching this JSON Schema, but it is not ({error}).
+
+Schema:
+{json.dumps(schema)}
+
+Text:
+{raw}
+
+Return ONLY the corrected JSON. No markdown, no code fences, no extra text."""
 
 
 # ─────────────────────────── ROADMAP ───────────────────────────
 
+ROADMAP_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["id", "title", "description", "icon"],
+        "properties": {
+            "id": {"type": "integer"},
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "icon": {"type": "string"},
+        },
+    },
+}
+
+
 def generate_roadmap(level):
     """Generate an ML learning roadmap based on user level."""
     prompt = f"""You are an expert Machine Learning instructor.
@@ -62,33 +308,20 @@ Example format:
   {{"id": 2, "title": "Types of ML", "description": "Supervised, unsupervised, and reinforcement learning", "icon": "📊"}}
 ]
 """
-    raw = _ask_llm(prompt)
-    raw = re.sub(r"```(?:json)?\s*", "", raw).strip().rstrip("`")
+    structured_prompt = f"""You are an expert Machine Learning instructor.
+Create a learning roadmap of 10-12 topics, in study order, for a **{level}** Machine Learning student.
+Beginner: foundations (what ML is, types of ML, linear regression...). Intermediate: ensembles, neural networks, NLP basics, feature engineering... Advanced: transformers, GANs, reinforcement learning, MLOps...
+Each topic: id counting from 1, short title, one-line description, one emoji icon."""
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        # Find the first complete JSON array using bracket depth
-        start = raw.find("[")
-        if start != -1:
-            depth = 0
-            for i in range(start, len(raw)):
-                if raw[i] == "[":
-                    depth += 1
-                elif raw[i] == "]":
-                    depth -= 1
-                    if depth == 0:
-                        try:
-                            return json.loads(raw[start:i+1])
-                        except json.JSONDecodeError:
-                            break
+        return _ask_llm_json(prompt, ROADMAP_SCHEMA, task="roadmap", structured_prompt=structured_prompt)
+    except ValueError:
         return [{"id": 1, "title": "Machine Learning Basics", "description": "Core ML concepts", "icon": "🤖"}]
 
 
 # ─────────────────────────── CONTENT ───────────────────────────
 
-def generate_reading_content(topic, level):
-    """Generate in-depth reading material (markdown)."""
-    prompt = f"""You are an expert ML educator. Create comprehensive, in-depth educational content about **"{topic}"** for a **{level}** level learner.
+def _reading_prompt(topic, level):
+    return f"""You are an expert ML educator. Create comprehensive, in-depth educational content about **"{topic}"** for a **{level}** level learner.
 
 Structure your response in well-formatted Markdown:
 1. **Introduction** — What is it and why does it matter?
@@ -101,12 +334,15 @@ Structure your response in well-formatted Markdown:
 
 Make it engaging, use emojis sparingly for visual appeal, and include analogies a {level} student would understand.
 """
-    return _ask_llm(prompt)
 
 
-def generate_code_content(topic, level):
-    """Generate hands-on code examples and practice problems."""
-    prompt = f"""You are an expert ML coding instructor. Create hands-on Python coding content about **"{topic}"** for a **{level}** level learner.
+def generate_reading_content(topic, level):
+    """Generate in-depth reading material (markdown)."""
+    return _ask_llm(_reading_prompt(topic, level), task="reading")
+
+
+def _code_prompt(topic, level):
+    return f"""You are an expert ML coding instructor. Create hands-on Python coding content about **"{topic}"** for a **{level}** level learner.
 
 Provide the following in well-formatted Markdown:
 
@@ -132,7 +368,11 @@ List required pip packages.
 
 Make the code production-quality, runnable, and educational.
 """
-    return _ask_llm(prompt)
+
+
+def generate_code_content(topic, level):
+    """Generate hands-on code examples and practice problems."""
+    return _ask_llm(_code_prompt(topic, level), task="code")
 
 
 def generate_audio_script(topic, level):
@@ -150,12 +390,11 @@ Rules:
 - Use natural pauses indicated by "..."
 - Keep sentences short and punchy for easy listening
 """
-    return _ask_llm(prompt)
+    return _ask_llm(prompt, task="audio_script")
 
 
-def generate_visual_content(topic, level):
-    """Generate text-based visual explanations: ASCII diagrams, flowcharts, concept maps."""
-    prompt = f"""You are an expert ML educator who specializes in VISUAL explanations.
+def _visual_prompt(topic, level):
+    return f"""You are an expert ML educator who specializes in VISUAL explanations.
 Create rich visual-textual content about **"{topic}"** for a **{level}** level learner.
 
 Include ALL of the following in well-formatted Markdown:
@@ -185,11 +424,46 @@ Provide a real-world analogy with a visual metaphor that makes the concept click
 
 Make everything highly visual and easy to scan. Use plenty of formatting, tables, and diagrams.
 """
-    return _ask_llm(prompt)
+
+
+def generate_visual_content(topic, level):
+    """Generate text-based visual explanations: ASCII diagrams, flowcharts, concept maps."""
+    return _ask_llm(_visual_prompt(topic, level), task="visual")
+
+
+# Learning styles whose content is plain markdown and can be streamed token by token
+STREAMABLE_STYLES = {
+    "Reading": (_reading_prompt, "reading"),
+    "Kinesthetic": (_code_prompt, "code"),
+    "Visual": (_visual_prompt, "visual"),
+}
+
+
+def stream_content(style, topic, level):
+    """Yield markdown chunks for a streamable learning style (see STREAMABLE_STYLES)."""
+    build_prompt, task = STREAMABLE_STYLES[style]
+    yield from _stream_llm(build_prompt(topic, level), task=task)
 
 
 # ─────────────────────────── QUIZ ───────────────────────────
 
+QUIZ_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["type", "question", "options", "correct_answer", "explanation"],
+        "properties": {
+            "type": {"type": "string", "enum": ["scenario", "code_analysis", "mcq"]},
+            "question": {"type": "string"},
+            "options": {"type": ["array", "null"], "items": {"type": "string"}},
+            "correct_answer": {"type": "string"},
+            "explanation": {"type": "string"},
+        },
+    },
+}
+
+
 def generate_quiz(topic, level):
     """Generate 3 varied quiz questions: scenario, code analysis, and MCQ."""
     prompt = f"""You are an ML assessment expert. Create exactly 3 quiz questions about **"{topic}"** for a **{level}** level learner.
@@ -233,72 +507,108 @@ Example:
   }}
 ]
 """
-    raw = _ask_llm(prompt)
-    raw = re.sub(r"```(?:json)?\s*", "", raw).strip().rstrip("`")
+    structured_prompt = f"""You are an ML assessment expert. Write exactly 3 quiz questions about **"{topic}"** for a **{level}** learner, in this order:
+1. "scenario": apply the concept to a real-life situation; options null.
+2. "code_analysis": include a short Python snippet in the question and ask what it does, what's wrong, or what it outputs; 4 options.
+3. "mcq": 4 options.
+When options are given, correct_answer must be exactly one of them. Keep explanations brief."""
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        match = re.search(r'\[.*\]', raw, re.DOTALL)
-        if match:
-            return json.loads(match.group())
+        return _ask_llm_json(prompt, QUIZ_SCHEMA, task="quiz", structured_prompt=structured_prompt)
+    except ValueError:
         return []
 
 
 # ─────────────────────────── FEEDBACK ───────────────────────────
 
+FREE_TEXT_EVALUATION_SCHEMA = {
+    "type": "object",
+    "required": ["per_question", "strong_areas", "weak_areas", "overall_feedback"],
+    "properties": {
+        "per_question": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["question_num", "credit", "feedback"],
+                "properties": {
+                    "question_num": {"type": "integer"},
+                    "credit": {"type": "number"},
+                    "feedback": {"type": "string"},
+                },
+            },
+        },
+        "strong_areas": {"type": "array", "items": {"type": "string"}},
+        "weak_areas": {"type": "array", "items": {"type": "string"}},
+        "overall_feedback": {"type": "string"},
+    },
+}
+
+
 def evaluate_answers(topic, level, quiz_data, user_answers):
-    """Evaluate user answers and provide feedback with strong/weak areas."""
-    qa_text = ""
+    """
+    Evaluate user answers and provide feedback with strong/weak areas.
+    Option-based questions are graded locally; only free-text (scenario)
+    answers are sent to the LLM.
+    """
+    graded = {}
+    free_text = []
     for i, (q, ua) in enumerate(zip(quiz_data, user_answers), 1):
+        if is_locally_gradable(q):
+            correct = grade_choice(q, ua)
+            graded[i] = (1.0 if correct else 0.0, choice_feedback(q, correct))
+        else:
+            free_text.append((i, q, ua))
+
+    review = _evaluate_free_text(topic, level, free_text, graded) if free_text else None
+    return build_feedback(topic, quiz_data, graded, review)
+
+
+def _evaluate_free_text(topic, level, items, graded):
+    """Score free-text answers with the LLM, writing credits into `graded`; returns its review or None."""
+    qa_text = ""
+    for i, q, ua in items:
         qa_text += f"""
-Question {i} ({q['type']}): {q['question']}
-Correct Answer: {q['correct_answer']}
+Question {i} ({q.get('type', 'scenario')}): {q.get('question', '')}
+Model Answer: {q.get('correct_answer', '')}
 User's Answer: {ua}
 """
 
-    prompt = f"""You are an ML educator evaluating a **{level}** student's quiz on **"{topic}"**.
+    prompt = f"""You are an ML educator evaluating a **{level}** student's quiz answers on **"{topic}"**.
 
-Here are the questions and answers:
+Here are the open-ended questions and answers:
 {qa_text}
 
-Provide a detailed evaluation in valid JSON (no markdown, no code fences):
+Provide an evaluation in valid JSON (no markdown, no code fences):
 {{
-  "score": <number 0-3>,
-  "total": 3,
-  "percentage": <number 0-100>,
   "per_question": [
     {{
-      "question_num": 1,
-      "is_correct": true or false,
-      "feedback": "specific feedback for this answer"
-    }},
-    {{
-      "question_num": 2,
-      "is_correct": true or false,
-      "feedback": "specific feedback for this answer"
-    }},
-    {{
-      "question_num": 3,
-      "is_correct": true or false,
+      "question_num": <question number>,
+      "credit": <number 0-1, partial credit allowed>,
       "feedback": "specific feedback for this answer"
     }}
   ],
-  "strong_areas": ["list of concepts the student understands well"],
-  "weak_areas": ["list of concepts the student needs to improve"],
-  "overall_feedback": "encouraging, constructive overall feedback paragraph"
+  "strong_areas": ["concepts the student understands well"],
+  "weak_areas": ["concepts the student needs to improve"],
+  "overall_feedback": "one or two encouraging, constructive sentences"
 }}
 
 Be fair but encouraging. Give partial credit for partially correct answers.
 """
-    raw = _ask_llm(prompt, model="llama3.1-8b")
-    raw = re.sub(r"```(?:json)?\s*", "", raw).strip().rstrip("`")
+    structured_prompt = f"""You are an ML educator grading a **{level}** student's open-ended answers on **"{topic}"**.
+{qa_text}
+For each question_num give credit 0-1 (partial credit allowed) and specific feedback, list strong and weak concept areas, and finish with one or two fair, encouraging sentences of overall feedback."""
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        match = re.search(r'\{.*\}', raw, re.DOTALL)
-        if match:
-            return json.loads(match.group())
-        return {"score": 0, "total": 3, "percentage": 0, "per_question": [], "strong_areas": [], "weak_areas": ["Unable to evaluate"], "overall_feedback": "Please try again."}
+        review = _ask_llm_json(prompt, FREE_TEXT_EVALUATION_SCHEMA, task="evaluation", structured_prompt=structured_prompt)
+    except ValueError:
+        for i, q, _ in items:
+            graded[i] = (0.0, f"We couldn't grade this answer automatically. Compare it with the model answer: {q.get('correct_answer', '')}")
+        return None
+
+    expected = {i for i, _, _ in items}
+    for entry in review["per_question"]:
+        if entry["question_num"] in expected:
+            credit = min(max(float(entry["credit"]), 0.0), 1.0)
+            graded[entry["question_num"]] = (credit, entry["feedback"])
+    return review
 
 
 # ─────────────────────────── REVISION ───────────────────────────
@@ -370,7 +680,15 @@ def detect_level_from_question(question):
     """
     Auto-detect user knowledge level from the phrasing of their question.
     Returns 'Beginner', 'Intermediate', or 'Advanced'.
+    The local classifier answers when it is confident; otherwise the LLM is asked.
     """
+    level, confidence = classify_level(question)
+    if confidence >= LEVEL_CONFIDENCE:
+        return level
+    return _detect_level_llm(question)
+
+
+def _detect_level_llm(question):
     prompt = f"""Analyze the following question and classify the asker's knowledge level.
 Return ONLY one word: Beginner, Intermediate, or Advanced.
 
@@ -382,23 +700,19 @@ Rules:
 - Advanced: asks about research-level concepts, mathematical depth, optimization details
 
 Return ONLY one word."""
-    raw = _ask_llm(prompt).strip()
+    raw = _ask_llm(prompt, task="level_detection").strip()
     for lvl in ["Advanced", "Intermediate", "Beginner"]:
         if lvl.lower() in raw.lower():
             return lvl
     return "Beginner"
 
 
-def answer_ml_chatbot(question, level=None, context_topic=None, chat_history=None):
-    """
-    GyanGuru — Level-adaptive general-purpose chatbot response.
-    Can answer any academic, educational, or general knowledge question.
-    Refuses offensive / harmful / hateful content.
-    Returns dict: {"text": str, "suggestions": list[str]}
-    """
-    if not level:
-        level = detect_level_from_question(question)
+SUGGESTIONS_MARKER = "---SUGGESTIONS---"
+SUGGESTIONS_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
 
+def _chatbot_prompt(question, level, context_topic=None, chat_history=None):
+    """Build the GyanGuru prompt for an already-resolved level."""
     # Level-specific personality configs
     level_configs = {
         "Beginner": {
@@ -423,14 +737,10 @@ def answer_ml_chatbot(question, level=None, context_topic=None, chat_history=Non
     if context_topic:
         context = f"The student is currently learning about **{context_topic}**. "
 
-    # Build conversation history string (last 6 turns)
-    history_str = ""
-    if chat_history:
-        for turn in chat_history[-6:]:
-            role = "Student" if turn["role"] == "user" else "GyanGuru"
-            content = turn.get("content", "")
-            if content:
-                history_str += f"\n{role}: {content}"
+    # Recent turns within the token budget, older ones as a rolling summary
+    history_str, _ = _chat_context.build(chat_history)
+    if history_str:
+        history_str = "\n" + history_str
 
     prompt = f"""You are **GyanGuru**, an expert, empathetic AI tutor who can help students with ANY subject or general knowledge question — science, mathematics, programming, Machine Learning, history, geography, languages, arts, technology, health, career advice, and more.
 Your personality is: {cfg['tone']}.
@@ -457,25 +767,85 @@ Format EXACTLY like this (no deviation):
 {'Previous conversation:' + history_str if history_str else ''}
 
 Student's current question: {question}"""
+    return prompt
+
+
+def _summarize_chat(previous_summary, transcript):
+    """Fold older chat turns into the rolling conversation summary (runs in the background)."""
+    prompt = f"""Summarize this tutoring conversation in at most 80 words for the tutor's own notes.
+Keep the topics covered, what the student understood or struggled with, and any stated goals.
+
+{'Summary so far: ' + previous_summary if previous_summary else ''}
+New turns:
+{transcript}
+
+Return ONLY the updated summary."""
+    return _ask_llm(prompt, task="chat_summary")
+
+
+_chat_context = ChatContextBuilder(summarize=_summarize_chat)
 
 
-    raw = _ask_llm(prompt, model="llama3.1-8b")
+def _chat_usage(prompt, raw):
+    """Estimated token counts for one chat call, returned to the client for accounting."""
+    return {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(raw)}
 
-    # Parse suggestions
+
+def _parse_suggestions(raw):
+    """Split a chatbot completion into (answer text, follow-up suggestions)."""
     suggestions = []
     text = raw
-    if "---SUGGESTIONS---" in raw:
-        parts = raw.split("---SUGGESTIONS---", 1)
+    if SUGGESTIONS_MARKER in raw:
+        parts = raw.split(SUGGESTIONS_MARKER, 1)
         text = parts[0].strip()
         try:
-            sug_raw = parts[1].strip()
-            match = re.search(r'\[.*?\]', sug_raw, re.DOTALL)
-            if match:
-                suggestions = json.loads(match.group())
-        except Exception:
+            suggestions = validate(extract_json(parts[1], kinds="["), SUGGESTIONS_SCHEMA)
+        except ValueError:
             suggestions = []
+    return text, suggestions
+
+
+def answer_ml_chatbot(question, level=None, context_topic=None, chat_history=None):
+    """
+    GyanGuru — Level-adaptive general-purpose chatbot response.
+    Can answer any academic, educational, or general knowledge question.
+    Refuses offensive / harmful / hateful content.
+    Returns dict: {"text": str, "suggestions": list[str], "level_used": str, "usage": dict}
+    """
+    if not level:
+        level = detect_level_from_question(question)
 
-    return {"text": text, "suggestions": suggestions, "level_used": level}
+    prompt = _chatbot_prompt(question, level, context_topic, chat_history)
+    raw = _ask_llm(prompt, task="chat")
+    text, suggestions = _parse_suggestions(raw)
+    return {"text": text, "suggestions": suggestions, "level_used": level, "usage": _chat_usage(prompt, raw)}
+
+
+def stream_ml_chatbot(question, level=None, context_topic=None, chat_history=None):
+    """
+    Streaming variant of answer_ml_chatbot.
+    Yields ("token", str) pairs for the answer text as it arrives, then a single
+    ("done", {"text", "suggestions", "level_used", "usage"}) once the completion ends.
+    """
+    if not level:
+        level = detect_level_from_question(question)
+
+    prompt = _chatbot_prompt(question, level, context_topic, chat_history)
+    raw = ""
+    sent = 0
+    for delta in _stream_llm(prompt, task="chat"):
+        raw += delta
+        cut = raw.find(SUGGESTIONS_MARKER)
+        # Hold back a tail that could be the start of the marker
+        safe = cut if cut != -1 else len(raw) - len(SUGGESTIONS_MARKER) + 1
+        if safe > sent:
+            yield "token", raw[sent:safe]
+            sent = safe
+    if SUGGESTIONS_MARKER not in raw and sent < len(raw):
+        yield "token", raw[sent:]
+
+    text, suggestions = _parse_suggestions(raw)
+    yield "done", {"text": text, "suggestions": suggestions, "level_used": level, "usage": _chat_usage(prompt, raw)}
 
 
 # ─────────────────────────── CONCEPT FLOW VISUALIZATION ───────────────────────────
@@ -530,20 +900,35 @@ Table showing key parameters, their effect, and typical values:
 |---|---|---|---|
 
 Make everything extremely visual, well-formatted, and easy to follow for a {level} learner."""
-    return _ask_llm(prompt, model="llama-3.3-70b")
+    return _ask_llm(prompt, task="concept_flow")
 
 
 def generate_concept_flow_for_chat(question, level="Beginner"):
     """Generate a concept flow specifically triggered from the GyanGuru chatbot."""
     # Extract the topic from the question
     topic_prompt = f'Extract the main ML concept/topic from this question in 3 words or less: "{question}". Return ONLY the topic name.'
-    topic = _ask_llm(topic_prompt).strip().strip('"').strip("'")
+    topic = _ask_llm(topic_prompt, task="topic_extraction").strip().strip('"').strip("'")
     flow = generate_concept_flow(topic, level)
     return topic, flow
 
 
 # ─────────────────────────── FLASHCARDS ───────────────────────────
 
+FLASHCARDS_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["front", "back", "emoji"],
+        "properties": {
+            "front": {"type": "string"},
+            "back": {"type": "string"},
+            "emoji": {"type": "string"},
+        },
+    },
+}
+
+
 def generate_flashcards(topic, level):
     """Generate interactive flashcards for quick review."""
     prompt = f"""Create exactly 5 flashcards about **"{topic}"** for a **{level}** level learner.
@@ -561,22 +946,9 @@ Example:
   {{"front": "Define learning rate", "back": "A hyperparameter controlling weight updates during training.", "emoji": "⚡"}}
 ]
 """
-    raw = _ask_llm(prompt, model="llama3.1-8b")
-    raw = re.sub(r"```(?:json)?\s*", "", raw).strip().rstrip("`")
+    structured_prompt = f"""Create exactly 5 flashcards about **"{topic}"** for a **{level}** level learner.
+front: a concise question or term (1 line). back: a clear answer or definition (2-3 lines max). emoji: one relevant emoji."""
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        start = raw.find("[")
-        if start != -1:
-            depth = 0
-            for i in range(start, len(raw)):
-                if raw[i] == "[":
-                    depth += 1
-                elif raw[i] == "]":
-                    depth -= 1
-                    if depth == 0:
-                        try:
-                            return json.loads(raw[start:i+1])
-                        except json.JSONDecodeError:
-                            break
+        return _ask_llm_json(prompt, FLASHCARDS_SCHEMA, task="flashcards", structured_prompt=structured_prompt)
+    except ValueError:
         return [{"front": f"What is {topic}?", "back": "Review this topic!", "emoji": "📘"}]
@@ -0,0 +1,114 @@
+"""
+LearnSphere — Grading Utility Module
+Scores option-based quiz questions (mcq, code_analysis) locally and assembles
+the feedback dict returned by evaluate_answers.
+"""
+
+import re
+
+
+OPTION_TYPES = ("mcq", "code_analysis")
+
+# Concept area credited or flagged for each question type
+AREA_LABELS = {
+    "mcq": "Core concepts of {topic}",
+    "code_analysis": "Reading and reasoning about {topic} code",
+    "scenario": "Applying {topic} to real-world problems",
+}
+
+_OPTION_LABEL = re.compile(r"^\(?([a-d])[).:]\s+")
+
+
+def normalize_answer(text):
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", str(text or "")).strip().lower()
+    return text.rstrip(".!;:").strip()
+
+
+def _option_index(text, options):
+    """Index of the option `text` refers to (by text, "B) text" or bare letter), or None."""
+    norm = normalize_answer(text)
+    normalized = [normalize_answer(o) for o in options]
+    unlabelled = [_OPTION_LABEL.sub("", o) for o in normalized]
+    for candidate in (norm, _OPTION_LABEL.sub("", norm)):
+        if candidate in normalized:
+            return normalized.index(candidate)
+        if candidate in unlabelled:
+            return unlabelled.index(candidate)
+    if len(norm) == 1 and "a" <= norm <= "z" and ord(norm) - ord("a") < len(options):
+        return ord(norm) - ord("a")
+    return None
+
+
+def is_locally_gradable(question):
+    """Whether a question has options we can grade without the LLM."""
+    return question.get("type") in OPTION_TYPES and bool(question.get("options"))
+
+
+def grade_choice(question, answer):
+    """Grade an option-based answer by resolving both it and the key to an option."""
+    options = question.get("options") or []
+    correct = _option_index(question.get("correct_answer"), options)
+    if correct is None:
+        return normalize_answer(answer) == normalize_answer(question.get("correct_answer"))
+    return _option_index(answer, options) == correct
+
+
+def choice_feedback(question, is_correct):
+    """Feedback line for a locally graded question, built from its explanation."""
+    explanation = question.get("explanation") or ""
+    if is_correct:
+        return f"Correct! {explanation}".strip()
+    options = question.get("options") or []
+    index = _option_index(question.get("correct_answer"), options)
+    answer = options[index] if index is not None else question.get("correct_answer")
+    return f"Not quite — the correct answer is \"{answer}\". {explanation}".strip()
+
+
+def _overall_message(topic, percentage):
+    if percentage >= 70:
+        return f"Great work on {topic}! You have a solid grasp of the essentials."
+    if percentage >= 40:
+        return f"Good effort on {topic}. Review the areas below and you'll have it down."
+    return f"{topic} takes practice. Work through the revision material and try again."
+
+
+def build_feedback(topic, quiz_data, graded, review=None):
+    """
+    Assemble the evaluation dict (score, total, percentage, per_question,
+    strong_areas, weak_areas, overall_feedback).
+    `graded` maps question number -> (credit 0..1, feedback); ungraded questions
+    score zero. `review` is the LLM's free-text evaluation, if one was made.
+    """
+    total = len(quiz_data)
+    per_question = []
+    strong, weak = [], []
+    score = 0.0
+    for num, question in enumerate(quiz_data, 1):
+        credit, feedback = graded.get(num, (0.0, "No answer was recorded for this question."))
+        score += credit
+        is_correct = credit >= 0.5
+        per_question.append({"question_num": num, "is_correct": is_correct, "feedback": feedback})
+        label = AREA_LABELS.get(question.get("type"))
+        if label and is_locally_gradable(question):
+            (strong if is_correct else weak).append(label.format(topic=topic))
+
+    if review:
+        strong += review.get("strong_areas", [])
+        weak += review.get("weak_areas", [])
+
+    score = round(score, 1)
+    percentage = round(score / total * 100) if total else 0
+    overall = _overall_message(topic, percentage)
+    if review and review.get("overall_feedback"):
+        overall = f"{overall} {review['overall_feedback']}"
+
+    return {
+        "score": int(score) if score.is_integer() else score,
+        "total": total,
+        "percentage": percentage,
+        "per_question": per_question,
+        "strong_areas": list(dict.fromkeys(strong)),
+        "weak_areas": list(dict.fromkeys(weak)),
+        "overall_feedback": overall,
+    }
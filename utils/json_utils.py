@@ -0,0 +1,106 @@
+"""
+LearnSphere — JSON Utility Module
+Pulls the first JSON value out of free-form LLM output and checks it against
+a small JSON-Schema subset (type, enum, required, properties, items, minItems).
+"""
+
+import json
+
+
+class SchemaError(ValueError):
+    """Raised when a value does not match its schema; message includes the JSON path."""
+
+
+_OPENERS = {"[": "]", "{": "}"}
+
+
+def extract_json(text, kinds="[{"):
+    """
+    Return the first complete JSON array/object in `text`.
+    Scans once, tracking nesting and skipping brackets inside strings; a
+    balanced candidate that still fails to parse restarts the scan just past
+    its opening bracket. `kinds` limits which openers may start a value.
+    Raises ValueError if nothing parses.
+    """
+    start = 0
+    while True:
+        begin = _find_opener(text, kinds, start)
+        if begin == -1:
+            raise ValueError("No JSON value found in model output")
+        end = _match_close(text, begin)
+        if end != -1:
+            try:
+                return json.loads(text[begin:end + 1])
+            except json.JSONDecodeError:
+                pass
+        start = begin + 1
+
+
+def _find_opener(text, kinds, start):
+    positions = [p for p in (text.find(k, start) for k in kinds) if p != -1]
+    return min(positions) if positions else -1
+
+
+def _match_close(text, begin):
+    """Index of the bracket closing the one at `begin`, or -1 if unbalanced."""
+    stack = []
+    in_string = False
+    escaped = False
+    for i in range(begin, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _OPENERS:
+            stack.append(_OPENERS[ch])
+        elif ch in "]}":
+            if not stack or stack.pop() != ch:
+                return -1
+            if not stack:
+                return i
+    return -1
+
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def validate(value, schema, path="$"):
+    """Check `value` against `schema`; raises SchemaError describing the first mismatch."""
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_TYPE_CHECKS[t](value) for t in types):
+            raise SchemaError(f"{path}: expected {' or '.join(types)}, got {type(value).__name__}")
+
+    if "enum" in schema and value not in schema["enum"]:
+        raise SchemaError(f"{path}: {value!r} is not one of {schema['enum']}")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                raise SchemaError(f"{path}: missing required key '{key}'")
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                validate(value[key], sub, f"{path}.{key}")
+
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            raise SchemaError(f"{path}: expected at least {schema['minItems']} items, got {len(value)}")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                validate(item, schema["items"], f"{path}[{i}]")
+    return value
@@ -0,0 +1,128 @@
+"""
+LearnSphere — Level Detection Module
+Guesses a learner's level (Beginner / Intermediate / Advanced) from the
+wording of a question using weighted terminology cues, in microseconds.
+Callers fall back to the LLM when the confidence is below LEVEL_CONFIDENCE.
+"""
+
+import os
+import re
+import math
+
+
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+# Chosen on the held-out split (scripts/eval_level_detector.py); below it the LLM decides
+LEVEL_CONFIDENCE = float(os.getenv("LEVEL_CONFIDENCE", "0.6"))
+# Sharpness of the score -> probability mapping
+TEMPERATURE = 1.2
+# Short, cue-less questions lean Beginner
+PRIOR = {"Beginner": 0.3, "Intermediate": 0.0, "Advanced": 0.0}
+
+# cue -> weight, per level
+CUES = {
+    "Beginner": {
+        # Question openers: every level asks "what is ...", so they only tip cue-less questions
+        "what is": 0.3, "what are": 0.3, "what's": 0.3, "what does": 0.3, "meaning of": 1.0,
+        "mean by": 1.0, "define": 0.8, "definition": 0.8, "simple terms": 1.5, "simple words": 1.5,
+        "simply": 0.8, "explain like": 1.5, "eli5": 2.0, "layman": 1.5, "basics": 1.2, "basic": 0.8,
+        "beginner": 1.5, "new to": 1.5, "just started": 1.5, "confused": 1.0, "don't understand": 1.2,
+        "dont understand": 1.2, "example of": 0.6, "why do we need": 1.0, "how do i start": 1.5,
+        "where should i start": 1.5, "should i learn": 1.2, "is it hard": 1.2, "real life": 0.8,
+        "everyday": 0.8, "kid": 1.0, "analogy": 0.6, "non-technical": 1.5, "plain english": 1.5,
+        "complete beginner": 2.0, "newcomer": 1.5, "in simple": 1.2,
+    },
+    "Intermediate": {
+        "implement": 1.0, "code": 0.6, "sklearn": 1.2, "scikit": 1.2, "pytorch": 1.0, "tensorflow": 1.0,
+        "keras": 1.0, "pandas": 1.0, "numpy": 0.8, "hyperparameter": 1.2, "tune": 0.8, "tuning": 0.8,
+        "cross-validation": 1.2, "cross validation": 1.2, "regularization": 1.0, "l1": 0.8, "l2": 0.8,
+        "overfitting": 0.8, "underfitting": 0.8, "learning rate": 1.0, "batch size": 1.0, "epoch": 0.8,
+        "epochs": 0.8, "precision": 0.8, "recall": 0.8, "f1": 1.0, "roc": 1.0, "auc": 1.0,
+        "confusion matrix": 1.0, "feature scaling": 1.2, "normalize": 0.6, "one-hot": 1.0,
+        "imbalanced": 1.0, "dropout": 1.0, "loss function": 0.8, "optimizer": 0.8, "adam": 0.8,
+        "gradient descent": 0.6, "validation set": 1.0, "grid search": 1.2, "pipeline": 0.8,
+        "random forest": 0.6, "xgboost": 1.0, "embedding": 0.8, "embeddings": 0.8, "fine-tune": 1.0,
+        "fine-tuning": 1.0, "transfer learning": 1.0, "batch norm": 1.0, "batch normalization": 1.0,
+        "vanishing gradient": 1.0, "when should i use": 1.0, "how to choose": 1.0, "how do i choose": 1.0,
+        "pros and cons": 0.8, "vs": 0.6, "versus": 0.6, "trade-off": 0.6, "tradeoff": 0.6,
+        "in practice": 0.8, "production": 0.8, "debug": 0.8, "my model": 1.0, "my training": 1.0,
+        "accuracy is": 0.6, "train and test": 0.8, "data leakage": 1.2, "early stopping": 1.0,
+        # Practitioner topics: models, data preparation, training and evaluation
+        "svm": 1.0, "support vector": 0.8, "k-means": 1.0, "k-nearest": 1.0, "knn": 1.0,
+        "logistic regression": 0.8, "gradient boosting": 1.0, "bagging": 1.0, "boosting": 0.8,
+        "lstm": 1.0, "cnn": 0.8, "rnn": 0.8, "resnet": 1.0, "bert": 1.0, "convolutional": 0.8,
+        "shap": 1.2, "feature importance": 1.0, "impute": 1.2, "missing values": 1.0,
+        "categorical": 1.0, "encoding": 0.6, "augmentation": 1.0, "gpu": 0.8, "data loader": 1.2,
+        "threshold": 0.8, "nan": 1.0, "validation": 0.8, "training loop": 1.0, "deploy": 1.0,
+        "metric": 0.8, "r squared": 1.0, "scale features": 1.0, "standardize": 1.0, "relu": 0.8,
+        "activation": 0.6, "pretrained": 1.0, "time series": 0.8, "bias and variance": 0.8,
+        "hidden layers": 0.8, "max_depth": 1.2, "train faster": 0.8, "speed up training": 1.0,
+    },
+    "Advanced": {
+        "derive": 1.5, "derivation": 1.5, "proof": 2.0, "prove": 2.0, "theorem": 2.0, "bound": 1.2,
+        "bounds": 1.2, "convergence": 1.5, "converge": 1.0, "convex": 1.2, "non-convex": 1.5,
+        "hessian": 2.0, "jacobian": 2.0, "eigenvalue": 1.5, "eigenvalues": 1.5, "spectral": 1.5,
+        "kl divergence": 1.5, "kullback": 2.0, "variational": 1.5, "elbo": 2.0,
+        "reparameterization": 2.0, "posterior": 1.2, "mcmc": 1.5, "asymptotic": 2.0,
+        "complexity": 0.8, "lipschitz": 2.0, "vc dimension": 2.0, "rademacher": 2.0, "pac": 1.5,
+        "regret": 1.5, "second-order": 1.5, "natural gradient": 2.0, "quadratic": 1.0,
+        "flash attention": 2.0, "mixed precision": 1.5, "quantization": 1.2, "distillation": 1.2,
+        "rlhf": 1.5, "ppo": 1.5, "importance sampling": 1.5, "off-policy": 1.5, "variance of the gradient": 2.0,
+        "initialization": 0.8, "xavier": 1.2, "layer norm": 1.0, "manifold": 1.5,
+        "information bottleneck": 2.0, "neural tangent kernel": 2.5, "double descent": 2.0,
+        "scaling laws": 2.0, "paper": 1.0, "arxiv": 1.5, "ablation": 1.5, "identifiability": 2.0,
+        "counterfactual": 1.5, "score matching": 2.0, "contrastive": 1.0, "lora": 1.2, "low-rank": 1.2,
+        "gradient flow": 1.5, "stochastic differential": 2.0, "saddle point": 1.5, "saddle points": 1.5,
+        "generalization gap": 1.5, "inductive bias": 1.2, "sample complexity": 2.0, "closed-form": 1.0,
+        "theoretical": 1.2, "formally": 1.2, "rigorous": 1.5, "guarantee": 1.2, "guarantees": 1.2,
+        # Research topics and estimation theory
+        "likelihood": 1.2, "estimator": 1.5, "consistent": 0.8, "unbiased": 1.0, "gradient variance": 1.5,
+        "normalizing flow": 2.0, "normalizing flows": 2.0, "change of variables": 1.5, "lottery ticket": 2.0,
+        "fisher information": 2.0, "score-based": 2.0, "sde": 1.5, "sdes": 1.5, "loss landscape": 1.5,
+        "optimization landscape": 1.5, "kernel trick": 1.2, "mercer": 2.0, "mixture-of-experts": 1.5,
+        "mixture of experts": 1.5, "lazy training": 2.0, "speculative decoding": 2.0, "grokking": 2.0,
+        "generalization error": 1.5, "rotary": 1.5, "wasserstein": 1.5, "reinforce": 1.2, "adamw": 1.2,
+        "et al": 1.5, "regime": 1.2, "cross-entropy gradient": 1.5, "softmax": 0.6, "sqrt": 0.8,
+        "lasso": 0.8, "support recovery": 2.0, "sparse": 0.6, "evidence lower bound": 2.0,
+        "behaviour policy": 1.5, "behavior policy": 1.5, "output distribution": 1.0,
+    },
+}
+
+_MATH = re.compile(r"[∇∑∂∫≤≥≈λσθ]|\\[a-z]+|\bO\(|\w\^\w|\bE\[")
+
+
+def _pattern(cue):
+    # Word boundaries only where the cue starts/ends with a word character
+    left = r"\b" if cue[0].isalnum() else ""
+    right = r"\b" if cue[-1].isalnum() else ""
+    return left + re.escape(cue) + right
+
+
+_PATTERNS = {
+    level: [(cue, re.compile(_pattern(cue)), weight) for cue, weight in cues.items()]
+    for level, cues in CUES.items()
+}
+
+
+def score_question(question):
+    """Raw per-level scores for a question."""
+    text = question.lower()
+    scores = dict(PRIOR)
+    for level, patterns in _PATTERNS.items():
+        # Cheap substring test first; the regex only confirms word boundaries
+        scores[level] += sum(weight for cue, pattern, weight in patterns if cue in text and pattern.search(text))
+    if _MATH.search(question):
+        scores["Advanced"] += 1.5
+    words = len(text.split())
+    if words > 30:
+        scores["Intermediate"] += 0.4
+        scores["Advanced"] += 0.4
+    return scores
+
+
+def classify_level(question):
+    """Return (level, confidence) where confidence is the winning class's probability."""
+    scores = score_question(question)
+    exps = {level: math.exp(TEMPERATURE * s) for level, s in scores.items()}
+    total = sum(exps.values())
+    level = max(LEVELS, key=lambda lvl: exps[lvl])
+    return level, exps[level] / total
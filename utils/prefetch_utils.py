@@ -0,0 +1,141 @@
+"""
+LearnSphere — Prefetch Utility Module
+Speculatively generates the next roadmap topics' content and quiz on a small
+low-priority pool, so moving from one topic to the next feels instant.
+Content lands in the shared response cache; quizzes are stashed per user and
+handed out once.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.genai_utils import (
+    generate_reading_content, generate_audio_script, generate_code_content,
+    generate_visual_content, generate_quiz
+)
+
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+# How many upcoming topics to warm
+PREFETCH_AHEAD = 2
+# Speculative generations allowed per user per hour
+PREFETCH_BUDGET = int(os.getenv("PREFETCH_BUDGET", "8"))
+# Unclaimed quizzes are dropped after this many seconds
+STASH_TTL = 30 * 60
+# How long a quiz request waits on a prefetch that is already generating
+CLAIM_WAIT = float(os.getenv("PREFETCH_CLAIM_WAIT", "5"))
+
+STYLE_GENERATORS = {
+    "Reading": generate_reading_content,
+    "Auditory": generate_audio_script,
+    "Kinesthetic": generate_code_content,
+    "Visual": generate_visual_content,
+}
+
+# Kept small so speculation never starves request-serving threads
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_lock = threading.RLock()
+_pending = {}   # user_key -> {topic: [Future]} still queued or running
+_stash = {}     # (user_key, topic, level) -> (Future, queued_at)
+_budget = {}    # user_key -> (window_start, used)
+
+
+def _spend(user_key, cost):
+    """Charge `cost` generations to the user's hourly budget; False if it would overrun."""
+    now = time.time()
+    start, used = _budget.get(user_key, (now, 0))
+    if now - start >= 3600:
+        start, used = now, 0
+    if used + cost > PREFETCH_BUDGET:
+        return False
+    _budget[user_key] = (start, used + cost)
+    return True
+
+
+def cancel(user_key, keep=()):
+    """
+    Drop the user's queued prefetches except those for topics in `keep`
+    (ones already running finish in the background).
+    """
+    with _lock:
+        pending = _pending.get(user_key, {})
+        for topic in [t for t in pending if t not in keep]:
+            for future in pending.pop(topic):
+                future.cancel()
+        for key in [k for k, (f, _) in _stash.items() if k[0] == user_key and f.cancelled()]:
+            del _stash[key]
+
+
+def schedule_next_topics(user_key, roadmap, current_topic, level, style):
+    """
+    Warm the PREFETCH_AHEAD topics after `current_topic` in `roadmap`
+    (the first ones when current_topic is None), cancelling speculation
+    for topics the learner has moved away from.
+    """
+    if not user_key or not roadmap:
+        return
+    titles = [t.get("title") for t in roadmap if isinstance(t, dict) and t.get("title")]
+    start = titles.index(current_topic) + 1 if current_topic in titles else 0
+    upcoming = titles[start:start + PREFETCH_AHEAD]
+
+    cancel(user_key, keep=set(upcoming) | {current_topic})
+    generate_content = STYLE_GENERATORS.get(style or "Reading", generate_reading_content)
+    with _lock:
+        _expire_stash()
+        pending = _pending.setdefault(user_key, {})
+        for topic in upcoming:
+            if (user_key, topic, level) in _stash or not _spend(user_key, 2):
+                continue
+            content = _executor.submit(_safe, generate_content, topic, level)
+            quiz = _executor.submit(_safe, generate_quiz, topic, level)
+            _stash[(user_key, topic, level)] = (quiz, time.time())
+            pending[topic] = [content, quiz]
+            for future in (content, quiz):
+                future.add_done_callback(lambda f, topic=topic: _forget_pending(user_key, topic, f))
+
+
+def _forget_pending(user_key, topic, future):
+    with _lock:
+        futures = _pending.get(user_key, {}).get(topic)
+        if futures and future in futures:
+            futures.remove(future)
+            if not futures:
+                del _pending[user_key][topic]
+        if not _pending.get(user_key):
+            _pending.pop(user_key, None)
+
+
+def take_quiz(user_key, topic, level, timeout=CLAIM_WAIT):
+    """
+    Claim a prefetched quiz for this user/topic/level. A prefetch still queued
+    behind other speculation is cancelled rather than waited for; one already
+    generating gets `timeout` seconds. Returns None when there is nothing
+    usable, and the caller generates the quiz itself.
+    """
+    with _lock:
+        entry = _stash.pop((user_key, topic, level), None)
+    if entry is None:
+        return None
+    future, _ = entry
+    if future.cancel() or future.cancelled():
+        return None
+    try:
+        return future.result(timeout=timeout) or None
+    except FutureTimeout:
+        return None
+
+
+def _safe(fn, *args):
+    """Prefetch failures are silent; the foreground request will simply regenerate."""
+    try:
+        return fn(*args)
+    except Exception:
+        return None
+
+
+def _expire_stash():
+    cutoff = time.time() - STASH_TTL
+    for key in [k for k, (_, queued_at) in _stash.items() if queued_at < cutoff]:
+        del _stash[key]
@@ -0,0 +1,275 @@
+"""
+LearnSphere — Resilience Utility Module
+Deadlines, jittered retries, hedged requests and a circuit breaker around
+LLM completions, plus a fake local backend (LLM_BACKEND=fake) for running
+the app and load tests without Cerebras.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cerebras.cloud.sdk import APIConnectionError, RateLimitError, InternalServerError
+
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 4.0
+
+# Hedging: send a duplicate request once the first is slower than the recent p95
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 20
+
+BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = int(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# End-to-end budget (seconds) per generator, covering every retry and hedge
+DEFAULT_DEADLINE = 60
+DEADLINES = {
+    "roadmap": 30,
+    "quiz": 30,
+    "flashcards": 30,
+    "reading": 45,
+    "code": 45,
+    "visual": 45,
+    "audio_script": 45,
+    "concept_flow": 60,
+    "level_detection": 15,
+    "topic_extraction": 15,
+}
+
+
+def deadline_for(task):
+    """Absolute (monotonic) deadline for a call to `task` starting now."""
+    return time.monotonic() + DEADLINES.get(task, DEFAULT_DEADLINE)
+
+
+# Errors worth retrying: the request may well succeed a moment later
+TRANSIENT_ERRORS = (APIConnectionError, RateLimitError, InternalServerError, ConnectionError, TimeoutError)
+
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM could not answer in time (outage, deadline or open breaker); callers should degrade."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive transient failures and rejects calls for
+    `cooldown` seconds; then lets a single probe through (half-open) and closes
+    again if it succeeds.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self):
+        """95th percentile, or None until HEDGE_MIN_SAMPLES calls have been seen."""
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+# Runs the racing attempts of hedged calls
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+class ResilientCaller:
+    """Applies deadline, retries, hedging and the breaker to one upstream."""
+
+    def __init__(self, breaker=None, hedge=LLM_HEDGE):
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def call(self, fn, task=None, hedge=True, deadline=None):
+        """
+        Return fn(timeout), where `timeout` is the seconds left in the task's
+        deadline (`deadline`, if the caller already started it). Transient errors are retried with full-jitter exponential
+        backoff while the deadline allows. Raises CircuitOpenError when the
+        breaker is open and LLMUnavailableError once retries or time run out;
+        other exceptions propagate unchanged.
+        """
+        self._count("calls")
+        deadline = deadline or deadline_for(task)
+        last_error = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError("The AI service is temporarily unavailable")
+            try:
+                return self._attempt(fn, deadline, hedge and self.hedge)
+            except TRANSIENT_ERRORS as e:
+                last_error = e
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            if attempt == LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                break
+            self._count("retries")
+            time.sleep(delay)
+        self._count("failed")
+        raise LLMUnavailableError(f"LLM request failed: {last_error}") from last_error
+
+    def _attempt(self, fn, deadline, hedge):
+        hedge_after = self._hedge_delay() if hedge else None
+        if hedge_after is None or time.monotonic() + hedge_after >= deadline:
+            return self._timed(fn, deadline)
+
+        primary = _hedge_executor.submit(self._timed, fn, deadline)
+        if wait([primary], timeout=hedge_after).done:
+            return primary.result()
+
+        self._count("hedges")
+        backup = _hedge_executor.submit(self._timed, fn, deadline)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Deadline exceeded waiting for a hedged LLM request")
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _hedge_delay(self):
+        p95 = self.latency.p95()
+        return None if p95 is None else max(p95, HEDGE_MIN_DELAY)
+
+    def _timed(self, fn, deadline):
+        """One upstream attempt, fed into the breaker and latency window."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Deadline exceeded before the LLM request was sent")
+        started = time.monotonic()
+        try:
+            result = fn(remaining)
+        except TRANSIENT_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # Upstream answered (e.g. 400); it is healthy even if the request wasn't
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        p95 = self.latency.p95()
+        counters["p95_ms"] = round(p95 * 1000) if p95 is not None else None
+        counters["breaker"] = self.breaker.stats()
+        return counters
+
+
+# ─────────────── FAKE BACKEND ───────────────
+
+class FakeBackend:
+    """
+    Offline stand-in for the Cerebras client, selected with LLM_BACKEND=fake.
+    Answers after FAKE_LLM_LATENCY seconds and fails transiently with
+    probability FAKE_LLM_FAILURE_RATE. json_schema requests get a minimal
+    instance of the schema, so JSON generators work end to end.
+    """
+
+    def __init__(self, latency=None, failure_rate=None):
+        self.latency = float(os.getenv("FAKE_LLM_LATENCY", "0.2")) if latency is None else latency
+        self.failure_rate = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0")) if failure_rate is None else failure_rate
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, response_format=None, stream=False, timeout=None, **_):
+        if timeout is not None and timeout < self.latency:
+            time.sleep(timeout)
+            raise TimeoutError("Fake LLM request timed out")
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Fake LLM transient failure")
+
+        if response_format and response_format.get("type") == "json_schema":
+            text = json.dumps(_sample(response_format["json_schema"]["schema"]))
+        else:
+            prompt = messages[-1]["content"]
+            text = f"**[{model}]** Sample response for: {' '.join(prompt.split()[:30])}"
+
+        if stream:
+            return (
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+                for word in text.split(" ")
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def _sample(schema):
+    """Smallest value that satisfies `schema` (the subset used by genai_utils)."""
+    kind = schema.get("type")
+    kind = next(t for t in kind if t != "null") if isinstance(kind, list) else kind
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {k: _sample(v) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_sample(schema.get("items", {"type": "string"}))] * max(schema.get("minItems", 1), 1)
+    return {"string": "sample", "integer": 1, "number": 1, "boolean": True}.get(kind)
@@ -0,0 +1,225 @@
+"""
+LearnSphere — Model Routing Module
+Maps each generator (task) to a model tier. Every tier has its own
+concurrency limit, so quick classification calls never queue behind long
+70B generations, and keeps latency/token/cost accounting. Under load the
+large tier can hand work down to a smaller model. Waiting for a slot counts
+against the call's deadline.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from utils.resilience_utils import LLMUnavailableError
+
+
+def _env(tier, key, default):
+    return os.getenv(f"LLM_{tier.upper()}_{key}", default)
+
+
+# USD per million tokens (input, output); adjust to your plan
+MODEL_COSTS = {
+    "llama3.1-8b": (0.10, 0.10),
+    "llama-3.3-70b": (0.85, 1.20),
+}
+
+# name -> (model, concurrent calls, tier to downgrade to under load). Concurrency 0
+# means unlimited (the default): the serving mode already bounds in-flight requests,
+# so set LLM_<TIER>_CONCURRENCY only to match a provider's rate limits.
+TIERS = {
+    "fast": (_env("fast", "MODEL", "llama3.1-8b"), int(_env("fast", "CONCURRENCY", "0")), None),
+    "standard": (_env("standard", "MODEL", "llama3.1-8b"), int(_env("standard", "CONCURRENCY", "0")), None),
+    "large": (_env("large", "MODEL", "llama-3.3-70b"), int(_env("large", "CONCURRENCY", "0")), "standard"),
+}
+
+DEFAULT_TIER = "standard"
+TASK_TIERS = {
+    "level_detection": "fast",
+    "topic_extraction": "fast",
+    "concept_flow": "large",
+    "chat_summary": "fast",
+}
+# Overrides, e.g. LLM_ROUTES="reading=large,quiz=fast"
+for _route in filter(None, os.getenv("LLM_ROUTES", "").split(",")):
+    _task, _, _tier = _route.partition("=")
+    TASK_TIERS[_task.strip()] = _tier.strip()
+
+# Downgrade when the large tier has no free slot within this many seconds
+LLM_DOWNGRADE = os.getenv("LLM_DOWNGRADE", "1") == "1"
+DOWNGRADE_WAIT = float(os.getenv("LLM_DOWNGRADE_WAIT", "2"))
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) when the API reports no usage."""
+    return len(text or "") // 4 + 1
+
+
+class Tier:
+    """One model tier: a concurrency limit (0 = unlimited) plus running totals."""
+
+    def __init__(self, name, model, concurrency, downgrade_to=None):
+        self.name = name
+        self.model = model
+        self.concurrency = concurrency
+        self.downgrade_to = downgrade_to
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.totals = {"calls": 0, "errors": 0, "downgraded_in": 0, "seconds": 0.0,
+                       "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+    @property
+    def limited(self):
+        return self._slots is not None
+
+    def acquire(self, timeout=None):
+        if self._slots is None:
+            with self._lock:
+                self.in_flight += 1
+            return True
+        with self._lock:
+            self.queued += 1
+        try:
+            acquired = self._slots.acquire(timeout=max(timeout, 0)) if timeout is not None else self._slots.acquire()
+        finally:
+            with self._lock:
+                self.queued -= 1
+        if acquired:
+            with self._lock:
+                self.in_flight += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def record(self, model, seconds, prompt_tokens, completion_tokens, error=False, downgraded=False):
+        price_in, price_out = MODEL_COSTS.get(model, (0.0, 0.0))
+        with self._lock:
+            self.totals["calls"] += 1
+            self.totals["errors"] += error
+            self.totals["downgraded_in"] += downgraded
+            self.totals["seconds"] += seconds
+            self.totals["prompt_tokens"] += prompt_tokens
+            self.totals["completion_tokens"] += completion_tokens
+            self.totals["cost_usd"] += (prompt_tokens * price_in + completion_tokens * price_out) / 1e6
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self.totals)
+            calls = totals["calls"]
+            return {
+                "model": self.model,
+                "concurrency": self.concurrency,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "calls": calls,
+                "errors": totals["errors"],
+                "downgraded_in": totals["downgraded_in"],
+                "avg_latency_ms": round(totals["seconds"] / calls * 1000) if calls else None,
+                "prompt_tokens": totals["prompt_tokens"],
+                "completion_tokens": totals["completion_tokens"],
+                "cost_usd": round(totals["cost_usd"], 6),
+            }
+
+
+class Slot:
+    """A held tier slot: the model to call and the accounting hook for the call."""
+
+    def __init__(self, tier, model, downgraded):
+        self.tier = tier
+        self.model = model
+        self.downgraded = downgraded
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def usage(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+
+
+class ModelRouter:
+    """Resolves tasks to tiers and hands out slots on them."""
+
+    def __init__(self, tiers=TIERS, task_tiers=TASK_TIERS, default=DEFAULT_TIER):
+        self.tiers = {name: Tier(name, *config) for name, config in tiers.items()}
+        self.task_tiers = task_tiers
+        self.default = default
+        self._lock = threading.Lock()
+        self._tasks = {}  # task -> token totals per call
+
+    def tier_for(self, task):
+        return self.tiers.get(self.task_tiers.get(task, self.default), self.tiers[self.default])
+
+    def model_for(self, task):
+        """Model a task is served by when there is no load."""
+        return self.tier_for(task).model
+
+    @contextmanager
+    def slot(self, task, model=None, deadline=None):
+        """
+        Hold a slot on the task's tier for the duration of one call. If the tier
+        may downgrade and stays full for DOWNGRADE_WAIT seconds, the slot comes
+        from the lower tier instead and `slot.model` is that tier's model.
+        Raises LLMUnavailableError if no slot frees up before `deadline`
+        (time.monotonic()). Yields a Slot; its timing and reported usage are
+        recorded on exit.
+        """
+        tier = self.tier_for(task)
+        model = model or tier.model
+        lower = self.tiers.get(tier.downgrade_to) if LLM_DOWNGRADE and tier.limited else None
+        downgraded = False
+
+        def remaining():
+            return None if deadline is None else deadline - time.monotonic()
+
+        if lower is not None:
+            first_wait = DOWNGRADE_WAIT if deadline is None else min(DOWNGRADE_WAIT, remaining())
+            if not tier.acquire(timeout=first_wait):
+                tier, model, downgraded = lower, lower.model, True
+                if not tier.acquire(timeout=remaining()):
+                    raise LLMUnavailableError(f"No free {tier.name} model slot before the deadline")
+        elif not tier.acquire(timeout=remaining()):
+            raise LLMUnavailableError(f"No free {tier.name} model slot before the deadline")
+
+        slot = Slot(tier, model, downgraded)
+        started = time.monotonic()
+        error = False
+        try:
+            yield slot
+        except BaseException:
+            error = True
+            raise
+        finally:
+            tier.release()
+            tier.record(model, time.monotonic() - started, slot.prompt_tokens, slot.completion_tokens,
+                        error=error, downgraded=downgraded)
+            self._record_task(task, slot)
+
+    def _record_task(self, task, slot):
+        with self._lock:
+            totals = self._tasks.setdefault(task or "other", {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "max_prompt_tokens": 0
+            })
+            totals["calls"] += 1
+            totals["prompt_tokens"] += slot.prompt_tokens
+            totals["completion_tokens"] += slot.completion_tokens
+            totals["max_prompt_tokens"] = max(totals["max_prompt_tokens"], slot.prompt_tokens)
+
+    def stats(self):
+        with self._lock:
+            tasks = {
+                task: dict(totals, avg_prompt_tokens=round(totals["prompt_tokens"] / totals["calls"]))
+                for task, totals in self._tasks.items()
+            }
+        return {
+            "routes": {task: self.tier_for(task).name for task in self.task_tiers},
+            "default": self.default,
+            "tiers": {name: tier.stats() for name, tier in self.tiers.items()},
+            "tasks": tasks,
+        }
@@ -0,0 +1,168 @@
+"""
+LearnSphere — Storage Backends
+Connection handling and SQL dialect behind models.py. SQLite (one file next to
+the app) is the default; DATABASE_URL=postgresql://... switches to a shared
+PostgreSQL server so several app nodes can serve the same learners.
+models.py writes SQLite-flavoured SQL ("?" placeholders, INSERT OR IGNORE);
+the PostgreSQL connection translates it.
+"""
+
+import os
+import re
+import sqlite3
+from functools import lru_cache
+from contextlib import contextmanager
+
+
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+# Any constant works; it only has to be the same for every app node
+_MIGRATION_LOCK = 7317
+
+
+class SQLiteBackend:
+    """A single SQLite file in WAL mode."""
+
+    name = "sqlite"
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        """Open and configure a new connection (PRAGMAs run once per connection)."""
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, cached_statements=128)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def migration(self, conn):
+        """One migration step under the database write lock."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def schema_version(self, conn):
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def set_schema_version(self, conn, version):
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    def create_schema(self, conn, script, version):
+        # Every statement is IF NOT EXISTS; MIGRATIONS take it from here
+        conn.executescript(script)
+
+
+@lru_cache(maxsize=512)
+def _to_postgres(sql):
+    """Rewrite one SQLite-flavoured statement for PostgreSQL."""
+    sql = sql.replace("%", "%%").replace("?", "%s")
+    if re.match(r"\s*INSERT OR IGNORE\b", sql):
+        sql = re.sub(r"INSERT OR IGNORE\b", "INSERT", sql, count=1).rstrip() + " ON CONFLICT DO NOTHING"
+    return sql
+
+
+class PostgresConnection:
+    """A psycopg connection with the sqlite3-style calls models.py makes."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def execute(self, sql, params=None):
+        if params is None:
+            return self._raw.execute(sql)
+        return self._raw.execute(_to_postgres(sql), params)
+
+    def executemany(self, sql, seq_of_params):
+        cursor = self._raw.cursor()
+        cursor.executemany(_to_postgres(sql), list(seq_of_params))
+        return cursor
+
+    def executescript(self, script):
+        self._raw.execute(script)
+
+    @property
+    def in_transaction(self):
+        from psycopg.pq import TransactionStatus
+        return self._raw.info.transaction_status != TransactionStatus.IDLE
+
+    @property
+    def closed(self):
+        return self._raw.closed or self._raw.broken
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+
+class PostgresBackend:
+    """A PostgreSQL server shared by every app node (needs psycopg 3)."""
+
+    name = "postgresql"
+
+    def __init__(self, url):
+        try:
+            import psycopg
+        except ImportError:
+            raise RuntimeError("DATABASE_URL points at PostgreSQL but psycopg is not installed: "
+                               "pip install 'psycopg[binary]'") from None
+        self.url = url
+        self.Error = psycopg.Error
+        self.IntegrityError = psycopg.IntegrityError
+
+    def connect(self):
+        import psycopg
+        from psycopg.rows import dict_row
+        from psycopg.types.string import TextLoader
+        raw = psycopg.connect(self.url, row_factory=dict_row)
+        # Timestamps come back as 'YYYY-MM-DD HH:MM:SS' text, as they do from SQLite
+        raw.adapters.register_loader("timestamp", TextLoader)
+        return PostgresConnection(raw)
+
+    @contextmanager
+    def migration(self, conn):
+        """One migration step; an advisory lock keeps concurrent nodes from double-applying."""
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (_MIGRATION_LOCK,))
+        try:
+            yield
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def schema_version(self, conn):
+        return conn.execute("SELECT version FROM schema_version").fetchone()["version"]
+
+    def set_schema_version(self, conn, version):
+        conn.execute("UPDATE schema_version SET version = ?", (version,))
+
+    def create_schema(self, conn, script, version):
+        """Create the tables at `version` on a fresh database; later MIGRATIONS apply on top."""
+        with self.migration(conn):
+            exists = conn.execute("SELECT to_regclass('schema_version') AS t").fetchone()["t"]
+            if exists is None:
+                conn.executescript(script)
+                conn.execute("CREATE TABLE schema_version (version INTEGER NOT NULL)")
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+
+
+def get_backend(url=DATABASE_URL, sqlite_path=None):
+    """Backend for a DATABASE_URL: empty or sqlite:///path for SQLite, postgresql://... for PostgreSQL."""
+    if url.startswith(("postgresql://", "postgres://")):
+        return PostgresBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url:
+        raise ValueError(f"Unsupported DATABASE_URL: {url.split(':', 1)[0]}://...")
+    return SQLiteBackend(sqlite_path)